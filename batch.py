@@ -0,0 +1,209 @@
+import os
+import json
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Union
+
+from parser_vmf import load_vmf, PROJECTION_ASSETS
+from extract_mat import MaterialExtractor
+from extract_mdl import ModelExtractor
+from extract_snd import SoundExtractor
+from content_index import ContentIndex
+from copy_engine import CopyEngine, COPY_MODES
+from dependency_cache import DependencyCache
+from output_sink import OutputSink, OUTPUT_FORMATS, open_sink
+from report import write_missing_report
+from pipeline import ContentPathManager
+
+
+# Asset names referenced by one map, before resolution
+class MapAssets(NamedTuple):
+	materials: Set[str]
+	skybox: Set[str]
+	models: Set[str]
+	sounds: Set[str]
+
+
+# Parse a VMF and collect its asset names, None if it can't be parsed (runs in worker processes)
+def collect_assets(vmf_path: str) -> Optional[MapAssets]:
+	parser = load_vmf(vmf_path, projection=PROJECTION_ASSETS, cache=False)
+	if parser is None:
+		return None
+
+	return MapAssets(
+		parser.get_all_materials(),
+		set(parser.get_skybox_materials()),
+		ModelExtractor(parse_workers=1).extract_from_vmf(parser),
+		SoundExtractor().extract_from_vmf(parser)
+	)
+
+
+# Expand files and directories into the sorted list of VMFs they contain
+def find_vmfs(paths: Iterable[str]) -> List[str]:
+	vmf_paths = {}
+
+	for path in paths:
+		if os.path.isdir(path):
+			for root, _, files in os.walk(path):
+				for name in files:
+					if name.lower().endswith('.vmf'):
+						vmf_paths.setdefault(os.path.join(root, name), None)
+		else:
+			vmf_paths.setdefault(path, None)
+
+	return sorted(vmf_paths)
+
+
+class BatchExtractor:
+	MAPS_MANIFEST_NAME = "maps.json"
+
+	# Init variables
+	def __init__(self, content_paths: List[str], index: ContentIndex = None, copy_engine: CopyEngine = None,
+				 dependency_cache: Optional[DependencyCache] = None, parse_workers: Optional[int] = None):
+		self.content_paths = content_paths
+		self.index = index if index is not None else ContentIndex(content_paths)
+		self.copy_engine = copy_engine if copy_engine is not None else CopyEngine(self.index)
+		self.parse_workers = max(1, parse_workers if parse_workers is not None else (os.cpu_count() or 1))
+		self.failed: List[str] = []
+
+		# One set of extractors for every map, so each asset is resolved once
+		self.mat_extractor = MaterialExtractor(content_paths, self.index, self.copy_engine, dependency_cache)
+		self.mdl_extractor = ModelExtractor(content_paths, self.index, self.copy_engine, parse_workers, dependency_cache)
+		self.sound_extractor = SoundExtractor(content_paths, self.index, self.copy_engine)
+
+	# Parse every VMF, across processes when there is more than one, results in input order
+	def collect(self, vmf_paths: List[str]) -> Dict[str, MapAssets]:
+		results = None
+
+		if self.parse_workers > 1 and len(vmf_paths) > 1:
+			try:
+				with ProcessPoolExecutor(max_workers=min(self.parse_workers, len(vmf_paths)), mp_context=multiprocessing.get_context('spawn')) as executor:
+					results = list(executor.map(collect_assets, vmf_paths))
+			except (OSError, BrokenProcessPool) as e:
+				print(f"Parallel VMF parsing failed, parsing serially: {e}")
+
+		if results is None:
+			results = [collect_assets(vmf_path) for vmf_path in vmf_paths]
+
+		assets = {}
+		for vmf_path, map_assets in zip(vmf_paths, results):
+			if map_assets is None:
+				self.failed.append(vmf_path)
+			else:
+				assets[vmf_path] = map_assets
+
+		return assets
+
+	# Extract the merged assets of every map into one output, each file resolved and copied once,
+	# returns map -> files it uses when maps_manifest is set
+	def extract(self, vmf_paths: List[str], output_dir: Union[str, OutputSink], maps_manifest: bool = False) -> Dict[str, List[str]]:
+		assets = self.collect(vmf_paths)
+
+		materials = set().union(*(map_assets.materials | map_assets.skybox for map_assets in assets.values()))
+		models = set().union(*(map_assets.models for map_assets in assets.values()))
+		sounds = set().union(*(map_assets.sounds for map_assets in assets.values()))
+
+		material_files = self.mat_extractor.find_files(materials)
+		model_files, model_materials = self.mdl_extractor.resolve(models)
+		model_material_files = self.mat_extractor.find_files(model_materials)
+		sound_files = self.sound_extractor.find_files(sounds)
+
+		jobs = (
+			self.mat_extractor.get_copy_jobs(material_files) +
+			self.mdl_extractor.get_copy_jobs(model_files) +
+			self.mat_extractor.get_copy_jobs(model_material_files) +
+			self.sound_extractor.get_copy_jobs(sound_files)
+		)
+		self.copy_engine.copy_files(jobs, output_dir)
+
+		map_files = {}
+		if maps_manifest:
+			map_files = {vmf_path.replace('\\', '/'): self._get_map_files(map_assets) for vmf_path, map_assets in assets.items()}
+			self._write_maps_manifest(output_dir, map_files)
+
+		return map_files
+
+	# Relative output paths of every file one map uses (resolutions are cached from the merged pass)
+	def _get_map_files(self, map_assets: MapAssets) -> List[str]:
+		material_files = self.mat_extractor.find_files(map_assets.materials | map_assets.skybox)
+		model_files, model_materials = self.mdl_extractor.resolve(map_assets.models)
+		material_files.update(self.mat_extractor.find_files(model_materials))
+		sound_files = self.sound_extractor.find_files(map_assets.sounds)
+
+		jobs = (
+			self.mat_extractor.get_copy_jobs(material_files) +
+			self.mdl_extractor.get_copy_jobs(model_files) +
+			self.sound_extractor.get_copy_jobs(sound_files)
+		)
+		return sorted({relative_path.replace('\\', '/') for _, relative_path in jobs})
+
+	# Save which maps use which files next to the extracted content
+	def _write_maps_manifest(self, output_dir: Union[str, OutputSink], map_files: Dict[str, List[str]]):
+		data = json.dumps({'maps': map_files}, indent=1, sort_keys=True).encode('utf-8')
+
+		if isinstance(output_dir, OutputSink):
+			output_dir.add_bytes(self.MAPS_MANIFEST_NAME, data)
+		else:
+			os.makedirs(output_dir, exist_ok=True)
+			with open(os.path.join(output_dir, self.MAPS_MANIFEST_NAME), 'wb') as f:
+				f.write(data)
+
+	# Write missing.txt for the whole batch
+	def write_report(self, output_dir: Union[str, OutputSink]) -> int:
+		return write_missing_report(output_dir, self.mat_extractor, self.mdl_extractor, self.sound_extractor, self.copy_engine)
+
+
+def main():
+	arg_parser = argparse.ArgumentParser(description="Extract the content of many VMFs into one output, each file copied once")
+	arg_parser.add_argument('vmfs', nargs='+', help="VMF files or directories containing VMFs")
+	arg_parser.add_argument('-c', '--content', action='append', help="Content path (game folder, addon or .vpk), can be repeated (default: the paths saved by the GUI)")
+	arg_parser.add_argument('--config', default="paths.json", help="Content paths file saved by the GUI, its folder also holds the caches")
+	arg_parser.add_argument('-o', '--output', default="extracted_batch", help="Output folder, or archive name for zip/vpk")
+	arg_parser.add_argument('--format', choices=OUTPUT_FORMATS, default='folder', help="Output kind")
+	arg_parser.add_argument('--mode', choices=COPY_MODES, default='copy', help="How files are written to an output folder")
+	arg_parser.add_argument('--copy-workers', type=int, default=CopyEngine.DEFAULT_WORKERS, help="Copy threads")
+	arg_parser.add_argument('--parse-workers', type=int, help="VMF/MDL parsing processes (default: one per CPU)")
+	arg_parser.add_argument('--incremental', action='store_true', help="Only copy new or changed files, remove stale ones")
+	arg_parser.add_argument('--hash', action='store_true', help="With --incremental, compare touched files by content hash")
+	arg_parser.add_argument('--maps-manifest', action='store_true', help=f"Write {BatchExtractor.MAPS_MANIFEST_NAME} listing the files each map uses")
+	arg_parser.add_argument('--cache', help="Dependency cache database (default: the one next to --config)")
+	arg_parser.add_argument('--no-cache', action='store_true', help="Don't use the content index and dependency caches")
+	args = arg_parser.parse_args()
+
+	vmf_paths = find_vmfs(args.vmfs)
+	if not vmf_paths:
+		arg_parser.error("No VMF files found")
+
+	path_manager = ContentPathManager(args.config)
+	content_paths = args.content or path_manager.get_all_content_paths()
+	if not content_paths:
+		arg_parser.error(f"No content paths: pass --content or add paths to {args.config}")
+
+	index = ContentIndex(content_paths, None if args.no_cache else path_manager.index_file)
+	index.build()
+	copy_engine = CopyEngine(index, args.copy_workers, args.mode, args.incremental, args.hash)
+	dependency_cache = None if args.no_cache else DependencyCache(args.cache or path_manager.dependency_cache_file)
+
+	output_dir = args.output if args.format == 'folder' else open_sink(f"{args.output}.{args.format}")
+	try:
+		batch = BatchExtractor(content_paths, index, copy_engine, dependency_cache, args.parse_workers)
+		batch.extract(vmf_paths, output_dir, args.maps_manifest)
+		total_missing = batch.write_report(output_dir)
+		if copy_engine.incremental:
+			copy_engine.finish()
+	finally:
+		if isinstance(output_dir, OutputSink):
+			output_dir.close()
+		if dependency_cache is not None:
+			dependency_cache.close()
+
+	print(f"Maps: {len(vmf_paths) - len(batch.failed)} extracted, {len(batch.failed)} failed")
+	for vmf_path in batch.failed:
+		print(f"  Unable to parse {vmf_path}")
+	print(f"Copied files: {copy_engine.copied}, {copy_engine.skipped} unchanged, {total_missing} missing")
+
+
+if __name__ == "__main__":
+	main()
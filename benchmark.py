@@ -0,0 +1,393 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from parser_vmf import VMFParser
+from parser_vmf_legacy import VMFParser as LegacyVMFParser
+from mdl_builder import build_mdl
+from instrumentation import format_bytes
+
+try:
+	import resource
+except ImportError:
+	resource = None
+
+
+# Streaming parser scanning the memory-mapped raw bytes
+class MappedVMFParser(VMFParser):
+	def parse_file(self, vmf_path: str, mapped: bool = True) -> bool:
+		return super().parse_file(vmf_path, mapped)
+
+
+# Memory-mapped ranges parsed across one process per CPU, whatever the file size (peak RSS excludes the workers)
+class ParallelVMFParser(VMFParser):
+	PARALLEL_THRESHOLD = 0
+
+	def parse_file(self, vmf_path: str, mapped: bool = True, workers: int = 0) -> bool:
+		return super().parse_file(vmf_path, mapped, workers or os.cpu_count() or 1)
+
+
+PARSERS = {
+	'legacy': LegacyVMFParser,
+	'streaming': VMFParser,
+	'full': lambda: VMFParser(keep_properties=True),
+	'mapped': MappedVMFParser,
+	'parallel': ParallelVMFParser,
+}
+
+
+# Write a synthetic VMF with the given number of brushes, sides per brush and entities
+def generate_vmf(path: str, brushes: int, sides: int = 6, entities: int = 0, materials: int = 200, models: int = 500, sounds: int = 100):
+	with open(path, 'w', encoding='utf-8') as f:
+		f.write('versioninfo\n{\n\t"editorversion" "400"\n\t"mapversion" "1"\n}\n')
+		f.write('world\n{\n\t"id" "1"\n\t"classname" "worldspawn"\n\t"skyname" "sky_day01_01"\n')
+
+		side_id = 1
+		for brush in range(brushes):
+			f.write(f'\tsolid\n\t{{\n\t\t"id" "{brush + 2}"\n')
+			for side in range(sides):
+				material = f"synthetic/mat_{(brush * sides + side) % materials:04d}"
+				f.write(
+					f'\t\tside\n\t\t{{\n\t\t\t"id" "{side_id}"\n'
+					f'\t\t\t"plane" "({brush} 0 0) ({brush} 64 0) ({brush} 64 64)"\n'
+					f'\t\t\t"material" "{material.upper()}"\n'
+					f'\t\t\t"uaxis" "[1 0 0 0] 0.25"\n\t\t\t"vaxis" "[0 -1 0 0] 0.25"\n'
+					f'\t\t\t"rotation" "0"\n\t\t\t"lightmapscale" "16"\n\t\t\t"smoothing_groups" "0"\n\t\t}}\n'
+				)
+				side_id += 1
+			f.write('\t\teditor\n\t\t{\n\t\t\t"color" "0 180 0"\n\t\t\t"visgroupshown" "1"\n\t\t}\n\t}\n')
+		f.write('}\n')
+
+		for entity in range(entities):
+			kind = entity % 3
+			if kind == 0:
+				f.write(f'entity\n{{\n\t"id" "{side_id + entity}"\n\t"classname" "prop_static"\n'
+						f'\t"model" "models/synthetic/prop_{entity % models:03d}.mdl"\n\t"origin" "0 0 0"\n')
+			elif kind == 1:
+				f.write(f'entity\n{{\n\t"id" "{side_id + entity}"\n\t"classname" "ambient_generic"\n'
+						f'\t"message" "synthetic/sound_{entity % sounds:03d}.wav"\n')
+			else:
+				f.write(f'entity\n{{\n\t"id" "{side_id + entity}"\n\t"classname" "info_overlay"\n'
+						f'\t"material" "synthetic/overlay_{entity % 50:02d}"\n')
+			f.write('\tconnections\n\t{\n\t\t"OnTrigger" "relay,Trigger,,0,-1"\n\t}\n')
+			f.write('\teditor\n\t{\n\t\t"color" "220 30 220"\n\t\t"logicalpos" "[0 0]"\n\t}\n}\n')
+
+
+# Peak resident set size of this process in bytes, or None if unavailable
+def peak_rss() -> Optional[int]:
+	if resource is None:
+		return None
+
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return peak if sys.platform == 'darwin' else peak * 1024
+
+
+# Parse once in this process and print timing, memory and result summary as JSON
+def run_worker(parser_name: str, vmf_path: str):
+	parser = PARSERS[parser_name]()
+
+	start = time.perf_counter()
+	parser.parse_file(vmf_path)
+	elapsed = time.perf_counter() - start
+
+	print(json.dumps({
+		'parser': parser_name,
+		'seconds': elapsed,
+		'peak_rss': peak_rss(),
+		'entities': len(parser.entities),
+		'world_brushes': len(parser.world_brushes),
+		'brushes': len(parser.brushes),
+		'sides': sum(len(getattr(b, 'sides', None) or b.material_ids) for b in parser.world_brushes + parser.brushes),
+		'materials': len(parser.get_all_materials()),
+		'worldspawn_properties': len(parser.worldspawn_properties),
+	}))
+
+
+# Run each parser in a fresh process so peak RSS is not shared between them
+def compare_parsers(vmf_path: str, repeat: int) -> List[Dict]:
+	results = []
+
+	for parser_name in PARSERS:
+		runs = []
+		for _ in range(repeat):
+			output = subprocess.run(
+				[sys.executable, os.path.abspath(__file__), '--worker', parser_name, vmf_path],
+				capture_output=True, text=True, check=True
+			).stdout
+			runs.append(json.loads(output))
+
+		best = min(runs, key=lambda r: r['seconds'])
+		results.append(best)
+
+	return results
+
+
+# Write the files generate_vmf references, spread round-robin over addon folders (returned as content paths)
+def generate_content(root: str, addons: int = 4, materials: int = 200, models: int = 500, sounds: int = 100, texture_size: int = 64 * 1024) -> List[str]:
+	content_paths = [os.path.join(root, f"addon_{addon:02d}") for addon in range(max(1, addons))]
+	texture = b'VTF\0' + bytes(texture_size - 4)
+	counter = iter(range(1 << 62))
+
+	def write(relative_path: str, data: bytes):
+		path = os.path.join(content_paths[next(counter) % len(content_paths)], relative_path)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		with open(path, 'wb') as f:
+			f.write(data)
+
+	material_names = [f"synthetic/mat_{i:04d}" for i in range(materials)] + [f"synthetic/overlay_{i:02d}" for i in range(50)]
+	for name in material_names:
+		write(f"materials/{name}.vmt", (
+			f'"LightmappedGeneric"\n{{\n\t"$basetexture" "{name}"\n\t"$bumpmap" "{name}_normal"\n'
+			f'\t"$surfaceprop" "concrete"\n}}\n'
+		).encode('utf-8'))
+		write(f"materials/{name}.vtf", texture)
+		write(f"materials/{name}_normal.vtf", texture)
+
+	for i in range(models):
+		name = f"models/synthetic/prop_{i:03d}"
+		write(f"{name}.mdl", build_mdl([f"prop_{i:03d}", f"prop_{i:03d}_skin1", "shared_metal"], ["models/synthetic/"]))
+		for extension in ('.vvd', '.dx90.vtx', '.phy'):
+			write(f"{name}{extension}", bytes(4096))
+		for texture_name in (f"prop_{i:03d}", f"prop_{i:03d}_skin1", "shared_metal"):
+			write(f"materials/models/synthetic/{texture_name}.vmt", f'"VertexLitGeneric"\n{{\n\t"$basetexture" "models/synthetic/{texture_name}"\n}}\n'.encode('utf-8'))
+			write(f"materials/models/synthetic/{texture_name}.vtf", texture)
+
+	for i in range(sounds):
+		write(f"sound/synthetic/sound_{i:03d}.wav", b'RIFF' + bytes(16 * 1024))
+
+	return content_paths
+
+
+# Stage benchmarks: each runs its prerequisites untimed, times one stage and returns its item count and bytes
+def bench_parse(vmf_path: str, content_paths: List[str], output_dir: str) -> Dict:
+	parser = VMFParser()
+	start = time.perf_counter()
+	parser.parse_file(vmf_path)
+	return {'seconds': time.perf_counter() - start, 'items': len(parser.entities) + len(parser.world_brushes) + len(parser.brushes), 'bytes': os.path.getsize(vmf_path)}
+
+
+def bench_index(vmf_path: str, content_paths: List[str], output_dir: str) -> Dict:
+	from content_index import ContentIndex
+
+	index = ContentIndex(content_paths)
+	start = time.perf_counter()
+	index.build()
+	return {'seconds': time.perf_counter() - start, 'items': len(index), 'bytes': 0}
+
+
+def bench_materials(vmf_path: str, content_paths: List[str], output_dir: str) -> Dict:
+	from content_index import ContentIndex
+	from extract_mat import MaterialExtractor
+
+	parser = VMFParser()
+	parser.parse_file(vmf_path)
+	index = ContentIndex(content_paths)
+	index.build()
+	extractor = MaterialExtractor(content_paths, index)
+
+	start = time.perf_counter()
+	material_files = extractor.find_files(parser.get_all_materials())
+	return {'seconds': time.perf_counter() - start, 'items': len(material_files), 'bytes': 0}
+
+
+def bench_models(vmf_path: str, content_paths: List[str], output_dir: str) -> Dict:
+	from content_index import ContentIndex
+	from extract_mdl import ModelExtractor
+
+	parser = VMFParser()
+	parser.parse_file(vmf_path)
+	index = ContentIndex(content_paths)
+	index.build()
+	extractor = ModelExtractor(content_paths, index)
+	models = extractor.extract_from_vmf(parser)
+
+	start = time.perf_counter()
+	model_files, materials = extractor.resolve(models)
+	return {'seconds': time.perf_counter() - start, 'items': len(model_files), 'bytes': 0}
+
+
+def bench_copy(vmf_path: str, content_paths: List[str], output_dir: str) -> Dict:
+	from content_index import ContentIndex
+	from copy_engine import CopyEngine
+	from extract_mat import MaterialExtractor
+
+	parser = VMFParser()
+	parser.parse_file(vmf_path)
+	index = ContentIndex(content_paths)
+	index.build()
+	extractor = MaterialExtractor(content_paths, index)
+	jobs = extractor.get_copy_jobs(extractor.find_files(parser.get_all_materials()))
+	engine = CopyEngine(index)
+
+	start = time.perf_counter()
+	engine.copy_files(jobs, output_dir)
+	return {'seconds': time.perf_counter() - start, 'items': engine.copied, 'bytes': engine.bytes_copied}
+
+
+def bench_pipeline(vmf_path: str, content_paths: List[str], output_dir: str) -> Dict:
+	from pipeline import ExtractionPipeline
+
+	pipeline = ExtractionPipeline(content_paths, log=lambda message: None)
+	start = time.perf_counter()
+	result = pipeline.run(vmf_path, output_dir)
+	return {'seconds': time.perf_counter() - start, 'items': result['copied'], 'bytes': result['bytes_copied'], 'stages': result['timings']}
+
+
+STAGES: Dict[str, Callable[[str, List[str], str], Dict]] = {
+	'parse': bench_parse,
+	'index': bench_index,
+	'materials': bench_materials,
+	'models': bench_models,
+	'copy': bench_copy,
+	'pipeline': bench_pipeline,
+}
+
+
+# Run one stage in this process and print its result and peak RSS as JSON
+def run_stage_worker(stage: str, vmf_path: str, content_paths: List[str]):
+	with tempfile.TemporaryDirectory() as output_dir:
+		result = STAGES[stage](vmf_path, content_paths, os.path.join(output_dir, 'out'))
+
+	result.update(stage=stage, peak_rss=peak_rss())
+	print(json.dumps(result))
+
+
+# Run each stage in a fresh process, the fastest of repeat runs is kept
+def run_suite(vmf_path: str, content_paths: List[str], repeat: int) -> List[Dict]:
+	results = []
+
+	for stage in STAGES:
+		runs = []
+		for _ in range(repeat):
+			output = subprocess.run(
+				[sys.executable, os.path.abspath(__file__), '--stage-worker', stage, vmf_path, '--content', *content_paths],
+				capture_output=True, text=True, check=True
+			).stdout
+			runs.append(json.loads(output.strip().splitlines()[-1]))
+
+		best = min(runs, key=lambda r: r['seconds'])
+		seconds = best['seconds'] or 1e-9
+		best['items_per_second'] = best['items'] / seconds
+		best['bytes_per_second'] = best['bytes'] / seconds
+		results.append(best)
+
+	return results
+
+
+# Compare suite results with a saved baseline, returns the stages slower than threshold (e.g. 0.1 = 10%)
+def compare_baseline(results: List[Dict], baseline: List[Dict], threshold: float) -> List[str]:
+	baseline_stages = {result['stage']: result for result in baseline}
+	regressions = []
+
+	for result in results:
+		previous = baseline_stages.get(result['stage'])
+		if not previous or not previous['seconds']:
+			print(f"  {result['stage']:<10} no baseline")
+			continue
+
+		change = result['seconds'] / previous['seconds'] - 1
+		flag = ""
+		if change > threshold:
+			regressions.append(result['stage'])
+			flag = "  REGRESSION"
+		print(f"  {result['stage']:<10} {previous['seconds']:8.3f}s -> {result['seconds']:8.3f}s  {change * 100:+6.1f}%{flag}")
+
+	return regressions
+
+
+# Peak RSS for the tables, n/a where the platform can't measure it
+def format_rss(size: Optional[int]) -> str:
+	return format_bytes(size) if size is not None else 'n/a'
+
+
+def main():
+	arg_parser = argparse.ArgumentParser(description="Compare parse time and peak RSS of the VMF parsers, or benchmark every pipeline stage with --suite")
+	arg_parser.add_argument('vmf', nargs='?', help="VMF file to parse (a synthetic map is generated if omitted)")
+	arg_parser.add_argument('--brushes', type=int, default=20000, help="Brushes in the synthetic map")
+	arg_parser.add_argument('--sides', type=int, default=6, help="Sides per brush in the synthetic map")
+	arg_parser.add_argument('--entities', type=int, default=5000, help="Entities in the synthetic map")
+	arg_parser.add_argument('--repeat', type=int, default=3, help="Runs per parser or stage, the fastest is reported")
+	arg_parser.add_argument('--json', action='store_true', help="Print results as JSON")
+	arg_parser.add_argument('--suite', action='store_true', help="Benchmark each pipeline stage and the full pipeline on a synthetic content tree")
+	arg_parser.add_argument('--addons', type=int, default=4, help="Addon folders in the synthetic content tree")
+	arg_parser.add_argument('--materials', type=int, default=200, help="Brush materials in the synthetic content tree")
+	arg_parser.add_argument('--models', type=int, default=500, help="Models in the synthetic content tree")
+	arg_parser.add_argument('--sounds', type=int, default=100, help="Sounds in the synthetic content tree")
+	arg_parser.add_argument('--content', nargs='*', help="Content paths to benchmark against instead of a synthetic tree")
+	arg_parser.add_argument('--save-baseline', help="Save the suite results to this file")
+	arg_parser.add_argument('--baseline', help="Compare the suite results with a saved baseline, exit 1 on regressions")
+	arg_parser.add_argument('--threshold', type=float, default=0.1, help="Slowdown ratio reported as a regression")
+	arg_parser.add_argument('--worker', help=argparse.SUPPRESS)
+	arg_parser.add_argument('--stage-worker', help=argparse.SUPPRESS)
+	args = arg_parser.parse_args()
+
+	if args.worker:
+		return run_worker(args.worker, args.vmf)
+	if args.stage_worker:
+		return run_stage_worker(args.stage_worker, args.vmf, args.content or [])
+
+	with tempfile.TemporaryDirectory() as temp_dir:
+		vmf_path = args.vmf
+		if not vmf_path:
+			vmf_path = os.path.join(temp_dir, 'synthetic.vmf')
+			generate_vmf(vmf_path, args.brushes, args.sides, args.entities, args.materials, args.models, args.sounds)
+
+		if args.suite:
+			return run_suite_command(args, vmf_path, temp_dir)
+
+		results = compare_parsers(vmf_path, args.repeat)
+
+	if args.json:
+		print(json.dumps(results, indent=2))
+		return
+
+	size = os.path.getsize(vmf_path) if args.vmf else None
+	print(f"VMF: {args.vmf or 'synthetic'}" + (f" ({format_bytes(size)})" if size else ""))
+	for result in results:
+		print(f"  {result['parser']:<10} {result['seconds']:8.3f}s  peak RSS {format_rss(result['peak_rss']):>10}  "
+			  f"{result['entities']} entities, {result['world_brushes'] + result['brushes']} brushes, {result['sides']} sides")
+
+	keys = ('entities', 'world_brushes', 'brushes', 'sides', 'materials', 'worldspawn_properties')
+	if any(results[0][k] != r[k] for r in results[1:] for k in keys):
+		print("WARNING: parsers returned different results")
+
+
+# Benchmark every stage, print and optionally save or compare the results, returns the exit code
+def run_suite_command(args, vmf_path: str, temp_dir: str) -> int:
+	content_paths = args.content
+	if not content_paths:
+		content_paths = generate_content(os.path.join(temp_dir, 'content'), args.addons, args.materials, args.models, args.sounds)
+
+	results = run_suite(vmf_path, content_paths, args.repeat)
+
+	if args.save_baseline:
+		with open(args.save_baseline, 'w', encoding='utf-8') as f:
+			json.dump(results, f, indent=2)
+
+	if args.json:
+		print(json.dumps(results, indent=2))
+	else:
+		print(f"VMF: {args.vmf or 'synthetic'}, {len(content_paths)} content paths")
+		for result in results:
+			throughput = f"{result['items_per_second']:10.0f} items/s"
+			if result['bytes']:
+				throughput += f"  {format_bytes(int(result['bytes_per_second']))}/s"
+			print(f"  {result['stage']:<10} {result['seconds']:8.3f}s  peak RSS {format_rss(result['peak_rss']):>10}  {result['items']:>7} items  {throughput}")
+
+	if args.baseline:
+		with open(args.baseline, 'r', encoding='utf-8') as f:
+			baseline = json.load(f)
+		print(f"Baseline: {args.baseline}")
+		if compare_baseline(results, baseline, args.threshold):
+			return 1
+
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,68 @@
+import sys
+import json
+import argparse
+from contextlib import redirect_stdout
+
+from pipeline import ContentPathManager, ExtractionPipeline
+from copy_engine import CopyEngine, COPY_MODES
+from output_sink import OUTPUT_FORMATS
+
+
+def main() -> int:
+	arg_parser = argparse.ArgumentParser(description="Extract the content a VMF uses without the GUI, results are printed as JSON")
+	arg_parser.add_argument('vmf', help="VMF file to extract")
+	arg_parser.add_argument('-c', '--content', action='append', help="Content path (game folder, addon or .vpk), can be repeated (default: the paths saved by the GUI)")
+	arg_parser.add_argument('--config', default="paths.json", help="Content paths file saved by the GUI, its folder also holds the caches")
+	arg_parser.add_argument('-o', '--output', help="Output folder, or archive name for zip/vpk (default: extracted_<map>)")
+	arg_parser.add_argument('--format', choices=OUTPUT_FORMATS, default='folder', help="Output kind")
+	arg_parser.add_argument('--mode', choices=COPY_MODES, default='copy', help="How files are written to an output folder")
+	arg_parser.add_argument('--copy-workers', type=int, default=CopyEngine.DEFAULT_WORKERS, help="Copy threads")
+	arg_parser.add_argument('--parse-workers', type=int, help="VMF/MDL parsing processes for large maps (default: one per CPU)")
+	arg_parser.add_argument('--incremental', action='store_true', help="Only copy new or changed files, remove stale ones")
+	arg_parser.add_argument('--hash', action='store_true', help="With --incremental, compare touched files by content hash")
+	arg_parser.add_argument('--streaming', action='store_true', help="Resolve, scan and copy assets through overlapping queues, files are copied as soon as they are found")
+	arg_parser.add_argument('--no-cache', action='store_true', help="Don't use the content index and dependency caches")
+	arg_parser.add_argument('--json', default='-', help="Where to write the JSON results (default: stdout)")
+	arg_parser.add_argument('--trace', help="Write a Chrome trace (chrome://tracing, Perfetto) of the pipeline stages")
+	arg_parser.add_argument('--metrics', help="Write the per-stage timings and counters as JSON")
+	arg_parser.add_argument('-q', '--quiet', action='store_true', help="Don't log progress to stderr")
+	args = arg_parser.parse_args()
+
+	path_manager = ContentPathManager(args.config)
+	content_paths = args.content or path_manager.get_all_content_paths()
+	if not content_paths:
+		arg_parser.error(f"No content paths: pass --content or add paths to {args.config}")
+
+	pipeline = ExtractionPipeline(
+		content_paths,
+		None if args.no_cache else path_manager.index_file,
+		None if args.no_cache else path_manager.dependency_cache_file,
+		args.copy_workers, args.mode, args.format, args.incremental, args.hash, args.streaming, args.parse_workers,
+		log=(lambda message: None) if args.quiet else (lambda message: print(message, file=sys.stderr))
+	)
+
+	# Errors printed by the parsers must not end up in the JSON on stdout
+	try:
+		with redirect_stdout(sys.stderr):
+			result = pipeline.run(args.vmf, args.output)
+		result['success'] = True
+	except Exception as e:
+		result = {'vmf': args.vmf, 'success': False, 'error': str(e)}
+
+	if args.trace and pipeline.instrumentation is not None:
+		pipeline.instrumentation.save_chrome_trace(args.trace)
+	if args.metrics and pipeline.instrumentation is not None:
+		pipeline.instrumentation.save_json(args.metrics)
+
+	output = json.dumps(result, indent=2)
+	if args.json == '-':
+		print(output)
+	else:
+		with open(args.json, 'w', encoding='utf-8') as f:
+			f.write(output)
+
+	return 0 if result['success'] else 1
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,249 @@
+import io
+import os
+import marshal
+import shutil
+import sqlite3
+import struct
+import threading
+from typing import BinaryIO, Dict, List, Optional, Tuple
+from vpk import VPKArchive, VPKEntry, is_vpk_path
+
+
+class ContentIndex:
+	# Top-level folders of a content root that hold extractable assets
+	ASSET_FOLDERS = ('materials', 'models', 'sound')
+	# Seconds to wait for another extractor writing the index cache
+	CACHE_TIMEOUT = 30
+
+	# Init variables
+	def __init__(self, directories: List[str] = None, cache_path: Optional[str] = None):
+		self.directories = directories or []
+		self.cache_path = cache_path
+		self.files: Dict[str, str] = {}
+		self.relative_paths: Dict[str, str] = {}
+		self.rescanned: List[str] = []
+		self.archived: Dict[str, Tuple[VPKArchive, VPKEntry]] = {}
+		self._built = False
+
+		# Instrumentation counters
+		self.lookups = 0
+		self.lookup_misses = 0
+		self.stat_calls = 0
+		self._lock = threading.Lock()
+
+	# Index every content root, earlier roots take priority over later ones
+	def build(self):
+		files: Dict[str, str] = {}
+		scanned: List[Tuple[str, Dict[str, str], Dict[str, int]]] = []
+		cache = self._open_cache()
+		self.rescanned = []
+
+		try:
+			for root in self.directories:
+				if is_vpk_path(root):
+					for relative_path, file_path in self._scan_archive(root).items():
+						files.setdefault(relative_path, file_path)
+					continue
+
+				root_files = self._load_root(cache, root) if cache else None
+
+				if root_files is None:
+					root_files, directories = self._scan_root(root)
+					self.rescanned.append(root)
+					scanned.append((root, root_files, directories))
+
+				for relative_path, file_path in root_files.items():
+					files.setdefault(relative_path, file_path)
+
+			# Written once every root is scanned, so the database is only locked for one short transaction
+			if cache and scanned:
+				self._store_roots(cache, scanned)
+		finally:
+			if cache:
+				cache.close()
+
+		self.files = files
+		self.relative_paths = {file_path: relative_path for relative_path, file_path in files.items()}
+		self._built = True
+
+	# Map lower-cased relative paths to absolute paths for one content root
+	def _scan_root(self, root: str) -> Tuple[Dict[str, str], Dict[str, int]]:
+		files: Dict[str, str] = {}
+		directories: Dict[str, int] = {}
+
+		try:
+			self.stat_calls += 1
+			stat = os.stat(root)
+			directories[root] = stat.st_mtime_ns
+			with os.scandir(root) as entries:
+				# Symlinked folders are followed, each entry carries the (st_dev, st_ino) of the
+				# directories above it so a link back to one of them (a loop) is not entered again
+				ancestors = frozenset([(stat.st_dev, stat.st_ino)])
+				pending = [
+					(entry.path, entry.name.lower(), ancestors) for entry in entries
+					if entry.name.lower() in self.ASSET_FOLDERS and entry.is_dir()
+				]
+		except OSError:
+			return files, directories
+
+		while pending:
+			directory, prefix, ancestors = pending.pop()
+			try:
+				self.stat_calls += 1
+				stat = os.stat(directory)
+				key = (stat.st_dev, stat.st_ino)
+				if key in ancestors:
+					continue
+				ancestors = ancestors | {key}
+				directories[directory] = stat.st_mtime_ns
+				with os.scandir(directory) as entries:
+					for entry in entries:
+						relative_path = f"{prefix}/{entry.name.lower()}"
+						if entry.is_dir():
+							pending.append((entry.path, relative_path, ancestors))
+						else:
+							files.setdefault(relative_path, entry.path)
+			except OSError:
+				continue
+
+		return files, directories
+
+	# Index the asset entries of a VPK archive under virtual paths inside the archive
+	def _scan_archive(self, vpk_path: str) -> Dict[str, str]:
+		files: Dict[str, str] = {}
+
+		try:
+			archive = VPKArchive(vpk_path)
+		except (OSError, ValueError, struct.error) as e:
+			print(f"VPK error: {e}")
+			return files
+
+		for relative_path, entry in archive.entries.items():
+			if relative_path.split('/', 1)[0] in self.ASSET_FOLDERS:
+				file_path = os.path.join(vpk_path, relative_path)
+				files[relative_path] = file_path
+				self.archived[file_path] = (archive, entry)
+
+		return files
+
+	# Open (or create) the on-disk index cache
+	def _open_cache(self) -> Optional[sqlite3.Connection]:
+		if not self.cache_path:
+			return None
+
+		try:
+			cache = sqlite3.connect(self.cache_path, timeout=self.CACHE_TIMEOUT)
+			cache.execute("CREATE TABLE IF NOT EXISTS roots (root TEXT PRIMARY KEY, directories BLOB, files BLOB)")
+			return cache
+		except sqlite3.Error as e:
+			print(f"Index cache error: {e}")
+			return None
+
+	# Return the cached files of a root if none of its directories changed since it was scanned
+	def _load_root(self, cache: sqlite3.Connection, root: str) -> Optional[Dict[str, str]]:
+		try:
+			row = cache.execute("SELECT directories, files FROM roots WHERE root = ?", (root,)).fetchone()
+		except sqlite3.Error as e:
+			print(f"Index cache error: {e}")
+			return None
+		if not row:
+			return None
+
+		try:
+			directories = marshal.loads(row[0])
+			relative_files = marshal.loads(row[1])
+		except (EOFError, ValueError, TypeError):
+			return None
+
+		# A directory's mtime changes whenever an entry is added, removed or renamed in it
+		self.stat_calls += len(directories)
+		for directory, mtime in directories.items():
+			try:
+				if os.stat(directory).st_mtime_ns != mtime:
+					return None
+			except OSError:
+				return None
+
+		return {relative_path: os.path.join(root, file_path) for relative_path, file_path in relative_files.items()}
+
+	# Save the scan results of roots in one transaction, file paths stored relative to their root
+	def _store_roots(self, cache: sqlite3.Connection, scanned: List[Tuple[str, Dict[str, str], Dict[str, int]]]):
+		rows = []
+		for root, files, directories in scanned:
+			prefix_length = len(os.path.join(root, ''))
+			relative_files = {relative_path: file_path[prefix_length:] for relative_path, file_path in files.items()}
+			rows.append((root, marshal.dumps(directories), marshal.dumps(relative_files)))
+
+		try:
+			with cache:
+				cache.executemany("INSERT OR REPLACE INTO roots (root, directories, files) VALUES (?, ?, ?)", rows)
+		except sqlite3.Error as e:
+			print(f"Index cache error: {e}")
+
+	# Resolve a path relative to the content roots (e.g. "materials/foo.vmt")
+	def find(self, relative_path: str) -> Optional[str]:
+		if not self._built:
+			self.build()
+
+		file_path = self.files.get(relative_path.lower().replace('\\', '/').lstrip('/'))
+		# Lookups come from the resolve and copy threads
+		with self._lock:
+			self.lookups += 1
+			if file_path is None:
+				self.lookup_misses += 1
+		return file_path
+
+	# Path of a resolved file under its content root ("materials/Foo/bar.vmt"), None if it isn't indexed.
+	# The asset folder is lower-cased whatever its case on disk, the rest keeps the on-disk case
+	def relative_path(self, file_path: str) -> Optional[str]:
+		key = self.relative_paths.get(file_path)
+		if key is None:
+			return None
+
+		folder, rest = key.split('/', 1)
+		parts = file_path.replace('\\', '/').split('/')
+		return '/'.join([folder] + parts[-(rest.count('/') + 1):])
+
+	# Check if a resolved path lives inside a VPK archive
+	def is_archived(self, file_path: str) -> bool:
+		return file_path in self.archived
+
+	# Open a resolved path for binary reading
+	def open(self, file_path: str) -> BinaryIO:
+		archived = self.archived.get(file_path)
+		if archived:
+			archive, entry = archived
+			return io.BytesIO(archive.read(entry))
+
+		return open(file_path, 'rb')
+
+	# Read the full contents of a resolved path
+	def read(self, file_path: str) -> bytes:
+		with self.open(file_path) as f:
+			return f.read()
+
+	# Size and mtime (ns) of a resolved path, archive entries use the archive's mtime
+	def stat(self, file_path: str) -> Tuple[int, int]:
+		with self._lock:
+			self.stat_calls += 1
+
+		archived = self.archived.get(file_path)
+		if archived:
+			archive, entry = archived
+			return len(entry.preload) + entry.length, os.stat(archive.path).st_mtime_ns
+
+		stat = os.stat(file_path)
+		return stat.st_size, stat.st_mtime_ns
+
+	# Copy a resolved path to a destination file
+	def copy(self, file_path: str, dest_path: str):
+		archived = self.archived.get(file_path)
+		if archived:
+			archive, entry = archived
+			with open(dest_path, 'wb') as f:
+				archive.copy_to(entry, f)
+		else:
+			shutil.copy2(file_path, dest_path)
+
+	def __len__(self) -> int:
+		return len(self.files)
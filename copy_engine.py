@@ -0,0 +1,218 @@
+import os
+import errno
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
+from content_index import ContentIndex
+from output_sink import OutputSink
+from manifest import CopyManifest
+
+try:
+	import fcntl
+except ImportError:
+	fcntl = None
+
+
+# Ways of materializing an extracted file at its destination
+COPY_MODES = ('copy', 'hardlink', 'reflink', 'symlink')
+
+# Linux ioctl that clones a file's extents (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+
+class CopyError(NamedTuple):
+	source: str
+	dest: str
+	error: str
+
+
+class CopyEngine:
+	DEFAULT_WORKERS = 8
+
+	# Init variables
+	def __init__(self, index: Optional[ContentIndex] = None, max_workers: int = DEFAULT_WORKERS, mode: str = 'copy',
+				 incremental: bool = False, hash_files: bool = False):
+		if mode not in COPY_MODES:
+			raise ValueError(f"Unknown copy mode: {mode}")
+
+		self.index = index
+		self.max_workers = max(1, max_workers)
+		self.mode = mode
+		self.incremental = incremental
+		self.hash_files = hash_files
+		self.manifests: Dict[str, CopyManifest] = {}
+		self.errors: List[CopyError] = []
+		self.copied = 0
+		self.skipped = 0
+		self.removed = 0
+		self.fallbacks = 0
+		# Files hard/sym/reflinked instead of copied, their bytes are not in bytes_copied
+		self.linked = 0
+		self.bytes_copied = 0
+		self._created_dirs: Set[str] = set()
+		self._lock = threading.Lock()
+
+	# Copy (source, relative path) pairs into an output folder or sink on a thread pool,
+	# returns the errors of this batch
+	def copy_files(self, jobs: Iterable[Tuple[str, str]], output: Union[str, OutputSink], mode: Optional[str] = None) -> List[CopyError]:
+		mode = mode or self.mode
+		if mode not in COPY_MODES:
+			raise ValueError(f"Unknown copy mode: {mode}")
+
+		# One job per destination, first source wins
+		unique_jobs: Dict[str, str] = {}
+		for source, relative_path in jobs:
+			unique_jobs.setdefault(relative_path.replace('\\', '/'), source)
+
+		errors = []
+		pending = []
+		if isinstance(output, OutputSink):
+			pending = [(source, relative_path, output) for relative_path, source in unique_jobs.items()]
+			copy_one = self._write_one
+		else:
+			manifest = self._get_manifest(output) if self.incremental else None
+			dests = {relative_path: os.path.join(output, relative_path) for relative_path in unique_jobs}
+			failed_dirs = self._create_directories(dests.values())
+
+			for relative_path, source in unique_jobs.items():
+				dest = dests[relative_path]
+				directory = os.path.dirname(dest)
+				if directory in failed_dirs:
+					errors.append(CopyError(source, dest, failed_dirs[directory]))
+				else:
+					pending.append((source, dest, mode, relative_path, manifest))
+			copy_one = self._copy_one
+
+		if len(pending) <= 1 or self.max_workers == 1:
+			results = [copy_one(job) for job in pending]
+		else:
+			with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+				results = list(executor.map(copy_one, pending))
+
+		copy_errors = [error for error in results if error]
+		errors.extend(copy_errors)
+
+		with self._lock:
+			self.errors.extend(errors)
+
+		return errors
+
+	# Manifest of an output folder for incremental runs, loaded once per folder
+	def _get_manifest(self, output_dir: str) -> CopyManifest:
+		with self._lock:
+			manifest = self.manifests.get(output_dir)
+			if manifest is None:
+				manifest = CopyManifest(output_dir, self.index, self.hash_files)
+				self.manifests[output_dir] = manifest
+			return manifest
+
+	# Remove outputs no longer referenced and save the manifests of incremental runs
+	def finish(self) -> int:
+		removed = 0
+		for manifest in self.manifests.values():
+			removed += len(manifest.finish())
+
+		self.removed += removed
+		return removed
+
+	# Create every destination directory once, returns directory -> error for failures
+	def _create_directories(self, dests: Iterable[str]) -> Dict[str, str]:
+		failed: Dict[str, str] = {}
+
+		for directory in {os.path.dirname(dest) for dest in dests}:
+			with self._lock:
+				if directory in self._created_dirs:
+					continue
+			try:
+				os.makedirs(directory, exist_ok=True)
+				with self._lock:
+					self._created_dirs.add(directory)
+			except OSError as e:
+				failed[directory] = str(e)
+
+		return failed
+
+	# Stream a single file into an archive sink, returns an error instead of raising
+	def _write_one(self, job: Tuple[str, str, OutputSink]) -> Optional[CopyError]:
+		source, relative_path, sink = job
+		try:
+			with (self.index.open(source) if self.index is not None else open(source, 'rb')) as f:
+				sink.add(relative_path, f)
+				size = f.tell()
+
+			with self._lock:
+				self.copied += 1
+				self.bytes_copied += size
+			return None
+		except Exception as e:
+			return CopyError(source, f"{sink.path}:{relative_path}", str(e))
+
+	# Copy or link a single file, returns an error instead of raising
+	def _copy_one(self, job: Tuple[str, str, str, str, Optional[CopyManifest]]) -> Optional[CopyError]:
+		source, dest, mode, relative_path, manifest = job
+		try:
+			if manifest is not None and manifest.is_current(relative_path, source, mode):
+				with self._lock:
+					self.skipped += 1
+				return None
+
+			# Never write through a link or into an inode left by a previous run
+			try:
+				os.unlink(dest)
+			except FileNotFoundError:
+				pass
+
+			linked = False
+			if self.index is not None and self.index.is_archived(source):
+				self.index.copy(source, dest)
+			elif mode == 'copy' or not self._link(source, dest, mode):
+				shutil.copy2(source, dest)
+			else:
+				linked = True
+
+			if manifest is not None:
+				manifest.record(relative_path, source, mode)
+			size = 0 if linked else os.path.getsize(dest)
+
+			with self._lock:
+				self.copied += 1
+				if linked:
+					self.linked += 1
+				else:
+					self.bytes_copied += size
+			return None
+		except Exception as e:
+			return CopyError(source, dest, str(e))
+
+	# Link dest to source, returns False when the filesystem can't and a plain copy is needed
+	def _link(self, source: str, dest: str, mode: str) -> bool:
+		try:
+			if mode == 'hardlink':
+				os.link(source, dest)
+			elif mode == 'symlink':
+				os.symlink(os.path.abspath(source), dest)
+			else:
+				self._reflink(source, dest)
+			return True
+		except OSError:
+			with self._lock:
+				self.fallbacks += 1
+			return False
+
+	# Clone the file's data blocks (copy-on-write) without copying bytes
+	def _reflink(self, source: str, dest: str):
+		if fcntl is None:
+			raise OSError(errno.EOPNOTSUPP, "Reflink not supported on this platform")
+
+		try:
+			with open(source, 'rb') as src, open(dest, 'wb') as dst:
+				fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+		except OSError:
+			try:
+				os.unlink(dest)
+			except OSError:
+				pass
+			raise
+
+		shutil.copystat(source, dest)
@@ -0,0 +1,134 @@
+import time
+import marshal
+import sqlite3
+import threading
+from typing import Any, List, Optional, Tuple
+
+
+class DependencyCache:
+	# Bump when a parser change alters what gets cached
+	VERSION = 1
+	DEFAULT_MAX_ENTRIES = 200000
+	# Seconds to wait for another extractor writing the cache
+	CACHE_TIMEOUT = 30
+	# Puts written per transaction, so the write lock is only held briefly and a crash loses at most this many
+	COMMIT_BATCH_SIZE = 64
+
+	# Init variables
+	def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+		self.path = path
+		self.max_entries = max_entries
+		self.hits = 0
+		self.misses = 0
+		self._used = time.time()
+		self._touched = set()
+		self._rows: List[Tuple[str, str, str, bytes, float]] = []
+		self._lock = threading.Lock()
+		self._db = self._open()
+
+	# Open (or create) the cache database, dropping entries written by another cache version
+	def _open(self) -> Optional[sqlite3.Connection]:
+		try:
+			db = sqlite3.connect(self.path, timeout=self.CACHE_TIMEOUT, check_same_thread=False)
+			# Readers and the writer of concurrent extractions don't block each other
+			db.execute("PRAGMA journal_mode=WAL")
+			if db.execute("PRAGMA user_version").fetchone()[0] != self.VERSION:
+				db.execute("DROP TABLE IF EXISTS dependencies")
+				db.execute(f"PRAGMA user_version = {self.VERSION}")
+			db.execute(
+				"CREATE TABLE IF NOT EXISTS dependencies "
+				"(kind TEXT, path TEXT, stamp TEXT, data BLOB, used REAL, PRIMARY KEY (kind, path))"
+			)
+			return db
+		except sqlite3.Error as e:
+			print(f"Dependency cache error: {e}")
+			return None
+
+	# Stamp of the files an entry was parsed from, e.g. ((size, mtime), (size, mtime))
+	@staticmethod
+	def stamp(*stats: Optional[Tuple[int, int]]) -> str:
+		return ';'.join(f"{stat[0]}:{stat[1]}" if stat else '-' for stat in stats)
+
+	# Cached dependencies of an asset, None if unseen or its files changed since
+	def get(self, kind: str, path: str, stamp: str) -> Any:
+		if self._db is None:
+			return None
+
+		with self._lock:
+			try:
+				row = self._db.execute(
+					"SELECT stamp, data FROM dependencies WHERE kind = ? AND path = ?", (kind, path)).fetchone()
+			except sqlite3.Error:
+				row = None
+
+			if not row or row[0] != stamp:
+				self.misses += 1
+				return None
+
+			try:
+				value = marshal.loads(row[1])
+			except (EOFError, ValueError, TypeError):
+				self.misses += 1
+				return None
+
+			self.hits += 1
+			self._touched.add((kind, path))
+			return value
+
+	# Store the dependencies of an asset (marshal-able values: tuples, lists, sets of str)
+	def put(self, kind: str, path: str, stamp: str, value: Any):
+		if self._db is None:
+			return
+
+		with self._lock:
+			try:
+				self._rows.append((kind, path, stamp, marshal.dumps(value), self._used))
+			except ValueError as e:
+				print(f"Dependency cache error: {e}")
+				return
+
+			if len(self._rows) >= self.COMMIT_BATCH_SIZE:
+				self._flush()
+
+	# Write the buffered puts in one short transaction (call with the lock held)
+	def _flush(self):
+		rows, self._rows = self._rows, []
+		if not rows:
+			return
+
+		try:
+			with self._db:
+				self._db.executemany("INSERT OR REPLACE INTO dependencies (kind, path, stamp, data, used) VALUES (?, ?, ?, ?, ?)", rows)
+		except sqlite3.Error as e:
+			print(f"Dependency cache error: {e}")
+
+	# Record this run's hits, evict the least recently used entries over the limit and save
+	def close(self):
+		with self._lock:
+			if self._db is None:
+				return
+
+			self._flush()
+			try:
+				self._db.executemany(
+					"UPDATE dependencies SET used = ? WHERE kind = ? AND path = ?",
+					[(self._used, kind, path) for kind, path in self._touched]
+				)
+				count = self._db.execute("SELECT COUNT(*) FROM dependencies").fetchone()[0]
+				if count > self.max_entries:
+					self._db.execute(
+						"DELETE FROM dependencies WHERE rowid IN (SELECT rowid FROM dependencies ORDER BY used LIMIT ?)",
+						(count - self.max_entries,)
+					)
+				self._db.commit()
+			except sqlite3.Error as e:
+				print(f"Dependency cache error: {e}")
+			finally:
+				self._db.close()
+				self._db = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
@@ -1,13 +1,66 @@
 import os
-import shutil
-from typing import Set, List, Dict
+import re
+from typing import Set, List, Dict, Optional, Tuple, Union
+from parser_vmf import VMFParser, load_vmf, PROJECTION_MATERIALS
+from content_index import ContentIndex
+from copy_engine import CopyEngine, CopyError
+from output_sink import OutputSink
+from dependency_cache import DependencyCache
+
+
+# VMT keys whose value is a texture (.vtf) path
+VMT_TEXTURE_KEYS = (
+	'$basetexture', '$basetexture2', '$basetexture3', '$basetexture4', '$hdrbasetexture', '$hdrcompressedtexture',
+	'$bumpmap', '$bumpmap2', '$normalmap', '$normalmap2', '$blendmodulatetexture',
+	'$detail', '$detail2', '$decaltexture', '$selfillummask', '$selfillumtexture',
+	'$envmap', '$envmapmask', '$phongexponenttexture', '$phongwarptexture', '$lightwarptexture',
+	'$refracttexture', '$reflecttexture', '$refracttinttexture', '$dudvmap', '$flowmap', '$flow_noise_texture',
+	'$tintmasktexture', '$ambientoccltexture', '$emissiveblendtexture', '$emissiveblendbasetexture',
+	'$emissiveblendflowtexture', '$fresnelrangestexture', '$iris', '$corneatexture', '$texture2',
+)
+
+# VMT keys whose value is another material (.vmt)
+VMT_MATERIAL_KEYS = ('$bottommaterial', '$underwateroverlay', '$fallbackmaterial', '$crackmaterial')
+
+# Patch materials name their base material with a path to the .vmt
+VMT_INCLUDE_KEY = 'include'
+
+# Every dependency key and its quoted or bare value in one pass
+VMT_DEPENDENCY_PATTERN = re.compile(
+	r'(?<![\w$])["\']?(' + '|'.join(re.escape(key) for key in VMT_TEXTURE_KEYS + VMT_MATERIAL_KEYS + (VMT_INCLUDE_KEY,)) + r')["\']?\s+'
+	r'(?:["\']([^"\']+)["\']|([^\s{}\[\]"\']+))',
+	re.IGNORECASE
+)
+
+# Engine-generated textures that never exist on disk
+IGNORED_TEXTURES = {'env_cubemap'}
+RENDER_TARGET_PREFIX = '_rt_'
 
 
 class MaterialExtractor:
 	# Init variables
-	def __init__(self, directories: List[str] = None):
+	def __init__(self, directories: List[str] = None, index: ContentIndex = None, copy_engine: CopyEngine = None,
+				 dependency_cache: Optional[DependencyCache] = None):
 		self.directories = directories or []
+		self.index = index if index is not None else ContentIndex(self.directories)
+		self.copy_engine = copy_engine if copy_engine is not None else CopyEngine(self.index)
+		self.dependency_cache = dependency_cache
 		self.missing: Set[str] = set()
+		self.copy_errors: List[CopyError] = []
+
+		# Shared for the whole run: material name -> files, VMT path -> (textures, materials)
+		self._resolved: Dict[str, List[str]] = {}
+		self._resolving: Set[str] = set()
+		self._vmt_cache: Dict[str, Tuple[List[str], List[str]]] = {}
+		self.vmts_parsed = 0
+
+	# Extract all material names from VMF (brush faces, overlays and decals)
+	def extract_from_vmf(self, vmf: Union[str, VMFParser]) -> Set[str]:
+		parser = load_vmf(vmf, projection=PROJECTION_MATERIALS) if isinstance(vmf, str) else vmf
+		if parser is None:
+			return set()
+
+		return parser.get_all_materials()
 
 	# Find material files on disk
 	def find_files(self, names: Set[str]) -> Dict[str, List[str]]:
@@ -22,88 +75,134 @@ class MaterialExtractor:
 
 		return found_files
 
-	# Find single material and associated textures
+	# Find single material and every file it depends on
 	def _find_single(self, name: str) -> List[str]:
-		clean_name = name.lower().replace('\\', '/')
-
-		for game_dir in self.directories:
-			vmt_path = os.path.join(game_dir, "materials", clean_name + ".vmt")
-
-			if os.path.exists(vmt_path):
-				files = [vmt_path]
-				files.extend(self._find_textures_from_vmt(vmt_path, game_dir))
-				return files
-
-		return []
-
-	# Parse VMT file to find associated VTF textures
-	def _find_textures_from_vmt(self, vmt_path: str, game_dir: str) -> List[str]:
-		import re
-		vtf_files = []
-
+		files, _ = self._resolve_material(name.lower().replace('\\', '/'))
+		return files
+
+	# Resolve a material's VMT -> VMT -> VTF dependency graph, returns the files and the
+	# materials still being resolved further up the stack (cycles) that the result excludes
+	def _resolve_material(self, clean_name: str) -> Tuple[List[str], Set[str]]:
+		files = self._resolved.get(clean_name)
+		if files is not None:
+			return files, set()
+		if clean_name in self._resolving:
+			return [], {clean_name}
+
+		vmt_path = self.index.find(f"materials/{clean_name}.vmt")
+		if not vmt_path:
+			self._resolved[clean_name] = []
+			return [], set()
+
+		self._resolving.add(clean_name)
 		try:
-			with open(vmt_path, 'r', encoding='utf-8', errors='ignore') as f:
-				content = f.read()
-
-			patterns = [
-				r'["\']?\$basetexture["\']?\s+["\']([^"\']+)["\']',
-				r'["\']?\$basetexture["\']?\s+([^\s{}\[\]]+)',
-				r'["\']?\$basetexture2["\']?\s+["\']([^"\']+)["\']',
-				r'["\']?\$basetexture2["\']?\s+([^\s{}\[\]]+)',
-				r'["\']?\$bumpmap["\']?\s+["\']([^"\']+)["\']',
-				r'["\']?\$bumpmap["\']?\s+([^\s{}\[\]]+)',
-				r'["\']?\$bumpmap2["\']?\s+["\']([^"\']+)["\']',
-				r'["\']?\$bumpmap2["\']?\s+([^\s{}\[\]]+)',
-				r'["\']?\$blendmodulatetexture["\']?\s+["\']([^"\']+)["\']',
-				r'["\']?\$blendmodulatetexture["\']?\s+([^\s{}\[\]]+)',
-				r'["\']?\$detail["\']?\s+["\']([^"\']+)["\']',
-				r'["\']?\$detail["\']?\s+([^\s{}\[\]]+)',
-				r'["\']?\$decaltexture["\']?\s+["\']([^"\']+)["\']',
-				r'["\']?\$decaltexture["\']?\s+([^\s{}\[\]]+)',
-				r'["\']?\$selfillummask["\']?\s+["\']([^"\']+)["\']',
-				r'["\']?\$selfillummask["\']?\s+([^\s{}\[\]]+)',
-			]
-
-			for pattern in patterns:
-				for match in re.findall(pattern, content, re.IGNORECASE):
-					texture_name = match.strip().replace('\\', '/')
-
-					if not texture_name or texture_name.lower() in ['env_cubemap', '_rt_camera']:
-						continue
-
-					for case_variant in [texture_name, texture_name.lower()]:
-						vtf_path = os.path.join(game_dir, "materials", case_variant + ".vtf")
-						if os.path.exists(vtf_path) and vtf_path not in vtf_files:
-							vtf_files.append(vtf_path)
-							break
-
+			textures, materials = self._parse_vmt(vmt_path)
+
+			resolved = {vmt_path: None}
+			for texture_name in textures:
+				vtf_path = self.index.find(f"materials/{texture_name}.vtf")
+				if vtf_path:
+					resolved[vtf_path] = None
+
+			open_names: Set[str] = set()
+			for material in materials:
+				dependency_files, dependency_open = self._resolve_material(material)
+				if not dependency_files and not dependency_open:
+					self.missing.add(material)
+				resolved.update(dict.fromkeys(dependency_files))
+				open_names |= dependency_open
+		finally:
+			self._resolving.discard(clean_name)
+
+		files = list(resolved)
+		open_names.discard(clean_name)
+
+		# Only complete subgraphs are memoized, a cycle member is finished by its caller
+		if not open_names:
+			self._resolved[clean_name] = files
+		return files, open_names
+
+	# Read a VMT once per run (or never, if the dependency cache has seen it unchanged)
+	# and return the textures and materials it references
+	def _parse_vmt(self, vmt_path: str) -> Tuple[List[str], List[str]]:
+		dependencies = self._vmt_cache.get(vmt_path)
+		if dependencies is not None:
+			return dependencies
+
+		stamp = None
+		if self.dependency_cache is not None:
+			try:
+				stamp = DependencyCache.stamp(self.index.stat(vmt_path))
+				cached = self.dependency_cache.get('vmt', vmt_path, stamp)
+			except OSError:
+				cached = None
+			if cached is not None:
+				dependencies = (cached[0], cached[1])
+				self._vmt_cache[vmt_path] = dependencies
+				return dependencies
+
+		self.vmts_parsed += 1
+		try:
+			content = self.index.read(vmt_path).decode('utf-8', errors='ignore')
 		except Exception:
-			pass
-
-		return vtf_files
-
-	# Copy found materials and textures to output directory
-	def copy_to_directory(self, material_files: Dict[str, List[str]], output_dir: str, preserve_structure: bool = True):
-		os.makedirs(output_dir, exist_ok=True)
+			content = ''
+
+		textures = {}
+		materials = {}
+		for match in VMT_DEPENDENCY_PATTERN.finditer(content):
+			key = match.group(1).lower()
+			value = (match.group(2) or match.group(3) or '').strip().replace('\\', '/').lower()
+			if not value:
+				continue
+
+			if key in VMT_TEXTURE_KEYS:
+				if value not in IGNORED_TEXTURES and not value.startswith(RENDER_TARGET_PREFIX):
+					textures[value] = None
+			else:
+				materials[self._clean_material_name(value)] = None
+
+		dependencies = (list(textures), list(materials))
+		self._vmt_cache[vmt_path] = dependencies
+		if stamp is not None:
+			self.dependency_cache.put('vmt', vmt_path, stamp, dependencies)
+		return dependencies
+
+	# Normalize a material reference ("materials/foo/bar.vmt" or "foo/bar") to "foo/bar"
+	def _clean_material_name(self, value: str) -> str:
+		value = value.lstrip('/')
+		if value.startswith('materials/'):
+			value = value[len('materials/'):]
+		if value.endswith('.vmt'):
+			value = value[:-4]
+		return value
+
+	# (source, relative path) copy jobs for found materials and textures
+	def get_copy_jobs(self, material_files: Dict[str, List[str]], preserve_structure: bool = True) -> List[Tuple[str, str]]:
+		jobs = []
 
 		for file_paths in material_files.values():
 			for file_path in file_paths:
-				try:
-					if preserve_structure:
-						dest_path = os.path.join(output_dir, self._get_relative_path(file_path))
-						os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-					else:
-						dest_path = os.path.join(output_dir, os.path.basename(file_path))
+				relative_path = self._get_relative_path(file_path) if preserve_structure else os.path.basename(file_path)
+				jobs.append((file_path, relative_path))
+
+		return jobs
 
-					shutil.copy2(file_path, dest_path)
-				except Exception:
-					pass
+	# Copy found materials and textures to output directory or archive
+	def copy_to_directory(self, material_files: Dict[str, List[str]], output_dir: Union[str, OutputSink], preserve_structure: bool = True, mode: Optional[str] = None) -> List[CopyError]:
+		jobs = self.get_copy_jobs(material_files, preserve_structure)
+		errors = self.copy_engine.copy_files(jobs, output_dir, mode)
+		self.copy_errors.extend(errors)
+		return errors
 
 	# Get relative path for material files
 	def _get_relative_path(self, file_path: str) -> str:
+		# Indexed files know their path under the content root, whatever the case of the asset folder on disk
+		relative_path = self.index.relative_path(file_path)
+		if relative_path is not None:
+			return relative_path
+
 		parts = file_path.replace('\\', '/').split('/')
-		try:
-			idx = parts.index("materials")
-			return '/'.join(parts[idx:])
-		except ValueError:
-			return os.path.basename(file_path)
\ No newline at end of file
+		for idx, part in enumerate(parts):
+			if part.lower() == "materials":
+				return '/'.join(parts[idx:])
+		return os.path.basename(file_path)
\ No newline at end of file
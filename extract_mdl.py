@@ -1,15 +1,40 @@
 import os
-import shutil
-from typing import Set, List, Dict, Optional
-from parser_vmf import VMFParser
-from parser_mdl import MDLParser
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Deque, Set, List, Dict, Optional, Tuple, Union
+from parser_vmf import VMFParser, load_vmf, PROJECTION_ENTITIES
+from parser_mdl import MDLParser, ModelDependencies
+from content_index import ContentIndex
+from copy_engine import CopyEngine, CopyError
+from output_sink import OutputSink
+from dependency_cache import DependencyCache
+
+
+# MDL to parse: a path on disk, or the file contents when it lives in a VPK
+ModelSource = Union[str, bytes]
 
 
 class ModelExtractor:
+	# Below this many MDLs, process startup costs more than parallel parsing saves
+	PARALLEL_THRESHOLD = 64
+	PARSE_CHUNK_SIZE = 32
+	# Chunks submitted per worker ahead of the results being stored
+	CHUNKS_IN_FLIGHT = 2
+
 	# Init variables
-	def __init__(self, directories: List[str] = None):
+	def __init__(self, directories: List[str] = None, index: ContentIndex = None, copy_engine: CopyEngine = None,
+				 parse_workers: Optional[int] = None, dependency_cache: Optional[DependencyCache] = None):
 		self.directories = directories or []
+		self.dependency_cache = dependency_cache
+		self.parse_workers = max(1, parse_workers if parse_workers is not None else (os.cpu_count() or 1))
+		self.index = index if index is not None else ContentIndex(self.directories)
+		self.copy_engine = copy_engine if copy_engine is not None else CopyEngine(self.index)
 		self.missing: Set[str] = set()
+		# Found MDL/PHY files that couldn't be read (e.g. a missing VPK chunk), still copied but not scanned
+		self.unparsable: Set[str] = set()
+		self.copy_errors: List[CopyError] = []
 		self.extensions = ['.mdl', '.vvd', '.vtx', '.phy', '.ani', '.dx90.vtx', '.dx80.vtx']
 		self.entities = [
 			'prop_static', 'prop_dynamic', 'prop_dynamic_override',
@@ -18,10 +43,17 @@ class ModelExtractor:
 			'cycler', 'monster_*', 'npc_*', 'weapon_*', 'item_*'
 		]
 
+		# Shared for the whole run: model path -> (model path -> files, materials), MDL path -> dependencies
+		self.mdl_parser = MDLParser()
+		self._resolved: Dict[str, Tuple[Dict[str, Dict[str, str]], Set[str]]] = {}
+		self._resolving: Set[str] = set()
+		self._model_dependencies: Dict[str, ModelDependencies] = {}
+		self.mdls_parsed = 0
+
 	# Extract all model paths from VMF
-	def extract_from_vmf(self, vmf_path: str) -> Set[str]:
-		parser = VMFParser()
-		if not parser.parse_file(vmf_path):
+	def extract_from_vmf(self, vmf: Union[str, VMFParser]) -> Set[str]:
+		parser = load_vmf(vmf, projection=PROJECTION_ENTITIES) if isinstance(vmf, str) else vmf
+		if parser is None:
 			return set()
 
 		models = set()
@@ -76,48 +108,228 @@ class ModelExtractor:
 		base_path = clean_path[:-4] if clean_path.endswith('.mdl') else clean_path
 		files = {}
 
-		for game_dir in self.directories:
-			for ext in self.extensions:
-				file_path = os.path.join(game_dir, base_path + ext)
-				if os.path.exists(file_path):
-					files[ext] = file_path
+		for ext in self.extensions:
+			file_path = self.index.find(base_path + ext)
+			if file_path:
+				files[ext] = file_path
 
 		return files
 
-	# Extract materials used by models
-	def extract_materials(self, model_files: Dict[str, Dict[str, str]]) -> Set[str]:
-		materials = set()
-		mdl_parser = MDLParser()
+	# Find models with every model they pull in ($includemodel, gibs) and the materials of all of them
+	def resolve(self, model_paths: Set[str]) -> Tuple[Dict[str, Dict[str, str]], Set[str]]:
+		model_files: Dict[str, Dict[str, str]] = {}
+		materials: Set[str] = set()
+		self._prefetch(model_paths)
 
-		for files in model_files.values():
-			if '.mdl' in files:
-				materials.update(mdl_parser.extract_materials_from_mdl(files['.mdl']))
+		for model_path in model_paths:
+			files, model_materials, _ = self._resolve_model(model_path.lower().replace('\\', '/'))
+			if files:
+				model_files.update(files)
+				materials |= model_materials
+			else:
+				self.missing.add(model_path)
+
+		return model_files, materials
+
+	# Resolve a model's MDL -> includemodel/gib -> MDL dependency graph, returns model path -> files,
+	# the materials, and the models still being resolved further up the stack (cycles) that the result excludes
+	def _resolve_model(self, clean_path: str) -> Tuple[Dict[str, Dict[str, str]], Set[str], Set[str]]:
+		resolved = self._resolved.get(clean_path)
+		if resolved is not None:
+			return resolved[0], resolved[1], set()
+		if clean_path in self._resolving:
+			return {}, set(), {clean_path}
+
+		files = self._find_single_files(clean_path)
+		if '.mdl' not in files:
+			self._resolved[clean_path] = ({}, set())
+			return {}, set(), set()
+
+		self._resolving.add(clean_path)
+		try:
+			dependencies = self._parse_model(files)
+
+			model_files = {clean_path: files}
+			materials = set(dependencies.materials)
+			open_paths: Set[str] = set()
+			for dependency in sorted(dependencies.include_models | dependencies.models):
+				dependency_files, dependency_materials, dependency_open = self._resolve_model(dependency)
+				if not dependency_files and not dependency_open:
+					self.missing.add(dependency)
+				model_files.update(dependency_files)
+				materials |= dependency_materials
+				open_paths |= dependency_open
+		finally:
+			self._resolving.discard(clean_path)
+
+		open_paths.discard(clean_path)
+
+		# Only complete subgraphs are memoized, a cycle member is finished by its caller
+		if not open_paths:
+			self._resolved[clean_path] = (model_files, materials)
+		return model_files, materials, open_paths
+
+	# Parse the dependency graph level by level so each level's MDLs can be parsed in parallel
+	def _prefetch(self, model_paths: Set[str]):
+		pending = {model_path.lower().replace('\\', '/') for model_path in model_paths}
+		seen = set(pending)
+
+		while pending:
+			level = []
+			for model_path in sorted(pending):
+				files = self._find_single_files(model_path)
+				if '.mdl' in files:
+					level.append(files)
+			self._parse_models(level)
+
+			pending = set()
+			for files in level:
+				dependencies = self._model_dependencies[files['.mdl']]
+				pending |= (dependencies.include_models | dependencies.models) - seen
+			seen |= pending
 
-		return materials
+	# Parse every not yet cached model, across processes for large batches
+	def _parse_models(self, model_files: List[Dict[str, str]]):
+		unique_files = {}
+		for files in model_files:
+			if files['.mdl'] not in self._model_dependencies:
+				unique_files.setdefault(files['.mdl'], files)
+		todo = [files for files in unique_files.values() if not self._load_cached(files)]
 
+		if self.parse_workers > 1 and len(todo) >= self.PARALLEL_THRESHOLD:
+			# Archived files are read as their chunk is submitted, only a few chunks are held in memory at once
+			in_flight: Deque[Future] = deque()
+			stored = 0
+			try:
+				# Spawned workers don't inherit the GUI's threads, results are stored in submission order
+				with ProcessPoolExecutor(max_workers=self.parse_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+					for i in range(0, len(todo), self.PARSE_CHUNK_SIZE):
+						if len(in_flight) >= self.parse_workers * self.CHUNKS_IN_FLIGHT:
+							for dependencies in in_flight.popleft().result():
+								self._store(todo[stored], dependencies)
+								stored += 1
+						chunk = [(self._get_source(files['.mdl']), self._get_source(files.get('.phy'))) for files in todo[i:i + self.PARSE_CHUNK_SIZE]]
+						in_flight.append(executor.submit(_parse_model_chunk, chunk))
 
-	# Copy found model files to output directory
-	def copy_to_directory(self, model_files: Dict[str, Dict[str, str]], output_dir: str, preserve_structure: bool = True):
-		os.makedirs(output_dir, exist_ok=True)
+					while in_flight:
+						for dependencies in in_flight.popleft().result():
+							self._store(todo[stored], dependencies)
+							stored += 1
+				return
+			except (OSError, BrokenProcessPool) as e:
+				print(f"Parallel MDL parsing failed, parsing serially: {e}")
+				todo = todo[stored:]
+
+		for files in todo:
+			self._store(files, _parse_model_source(self.mdl_parser, self._get_source(files['.mdl']), self._get_source(files.get('.phy'))))
+
+	# Materials and models one found model references ($includemodel, keyvalues, gibs)
+	def scan_dependencies(self, files: Dict[str, str]) -> ModelDependencies:
+		if '.mdl' not in files:
+			return ModelDependencies(set(), set(), set())
+		return self._parse_model(files)
+
+	# Parse a model's MDL (and PHY for gibs) once per run
+	def _parse_model(self, files: Dict[str, str]) -> ModelDependencies:
+		mdl_path = files['.mdl']
+		if mdl_path not in self._model_dependencies and not self._load_cached(files):
+			self._store(files, _parse_model_source(self.mdl_parser, self._get_source(mdl_path), self._get_source(files.get('.phy'))))
+		return self._model_dependencies[mdl_path]
+
+	# Stamp of the MDL and PHY a model's dependencies come from, None if they can't be stat'ed
+	def _get_stamp(self, files: Dict[str, str]) -> Optional[str]:
+		try:
+			phy_path = files.get('.phy')
+			return DependencyCache.stamp(self.index.stat(files['.mdl']), self.index.stat(phy_path) if phy_path else None)
+		except OSError:
+			return None
+
+	# Load a model's dependencies from the persistent cache, False if it has to be parsed
+	def _load_cached(self, files: Dict[str, str]) -> bool:
+		if self.dependency_cache is None:
+			return False
+
+		stamp = self._get_stamp(files)
+		cached = self.dependency_cache.get('mdl', files['.mdl'], stamp) if stamp else None
+		if cached is None:
+			return False
+
+		self._model_dependencies[files['.mdl']] = ModelDependencies(*cached)
+		return True
+
+	# Keep a parsed model's dependencies for this run and in the persistent cache
+	def _store(self, files: Dict[str, str], dependencies: ModelDependencies):
+		self.mdls_parsed += 1
+		self._model_dependencies[files['.mdl']] = dependencies
+		if self.dependency_cache is not None and files['.mdl'] not in self.unparsable and files.get('.phy') not in self.unparsable:
+			stamp = self._get_stamp(files)
+			if stamp:
+				self.dependency_cache.put('mdl', files['.mdl'], stamp, tuple(dependencies))
+
+	# Path to parse from disk, or the contents of a file inside a VPK, None if it can't be read
+	def _get_source(self, file_path: Optional[str]) -> Optional[ModelSource]:
+		if file_path and self.index.is_archived(file_path):
+			try:
+				return self.index.read(file_path)
+			except (OSError, ValueError) as e:
+				print(f"Unable to read model file {file_path}: {e}")
+				self.unparsable.add(file_path)
+				return None
+		return file_path
+
+	# (source, relative path) copy jobs for found model files
+	def get_copy_jobs(self, model_files: Dict[str, Dict[str, str]], preserve_structure: bool = True) -> List[Tuple[str, str]]:
+		jobs = []
 
 		for files in model_files.values():
 			for file_path in files.values():
-				try:
-					if preserve_structure:
-						dest_path = os.path.join(output_dir, self._get_relative_path(file_path))
-						os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-					else:
-						dest_path = os.path.join(output_dir, os.path.basename(file_path))
+				relative_path = self._get_relative_path(file_path) if preserve_structure else os.path.basename(file_path)
+				jobs.append((file_path, relative_path))
+
+		return jobs
 
-					shutil.copy2(file_path, dest_path)
-				except Exception:
-					pass
+	# Copy found model files to output directory or archive, extra jobs (e.g. their materials) go in the same batch
+	def copy_to_directory(self, model_files: Dict[str, Dict[str, str]], output_dir: Union[str, OutputSink], preserve_structure: bool = True, mode: Optional[str] = None,
+						  extra_jobs: Optional[List[Tuple[str, str]]] = None) -> List[CopyError]:
+		jobs = self.get_copy_jobs(model_files, preserve_structure) + (extra_jobs or [])
+		errors = self.copy_engine.copy_files(jobs, output_dir, mode)
+		self.copy_errors.extend(errors)
+		return errors
 
 	# Get relative path for model files
 	def _get_relative_path(self, file_path: str) -> str:
+		# Indexed files know their path under the content root, whatever the case of the asset folder on disk
+		relative_path = self.index.relative_path(file_path)
+		if relative_path is not None:
+			return relative_path
+
 		parts = file_path.replace('\\', '/').split('/')
-		try:
-			idx = parts.index("models")
-			return '/'.join(parts[idx:])
-		except ValueError:
-			return os.path.basename(file_path)
\ No newline at end of file
+		for idx, part in enumerate(parts):
+			if part.lower() == "models":
+				return '/'.join(parts[idx:])
+		return os.path.basename(file_path)
+
+
+# Dependencies of one model from its MDL and optional PHY
+def _parse_model_source(parser: MDLParser, mdl_source: Optional[ModelSource], phy_source: Optional[ModelSource]) -> ModelDependencies:
+	if mdl_source is None:
+		dependencies = ModelDependencies(set(), set(), set())
+	elif isinstance(mdl_source, bytes):
+		dependencies = parser.extract_dependencies_from_data(mdl_source)
+	else:
+		dependencies = parser.extract_dependencies_from_mdl(mdl_source)
+
+	if phy_source is not None:
+		if isinstance(phy_source, bytes):
+			gibs = parser.extract_gibs_from_data(phy_source)
+		else:
+			gibs = parser.extract_gibs_from_phy(phy_source)
+		dependencies = dependencies._replace(models=dependencies.models | gibs)
+
+	return dependencies
+
+
+# Parse a chunk of models in a worker process
+def _parse_model_chunk(chunk: List[Tuple[Optional[ModelSource], Optional[ModelSource]]]) -> List[ModelDependencies]:
+	parser = MDLParser()
+	return [_parse_model_source(parser, mdl_source, phy_source) for mdl_source, phy_source in chunk]
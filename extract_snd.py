@@ -1,14 +1,19 @@
 import os
-import shutil
-from typing import Set, List, Dict, Optional
-from parser_vmf import VMFParser
+from typing import Set, List, Dict, Optional, Tuple, Union
+from parser_vmf import VMFParser, load_vmf, PROJECTION_ENTITIES
+from content_index import ContentIndex
+from copy_engine import CopyEngine, CopyError
+from output_sink import OutputSink
 
 
 class SoundExtractor:
 	# Init variables
-	def __init__(self, directories: List[str] = None):
+	def __init__(self, directories: List[str] = None, index: ContentIndex = None, copy_engine: CopyEngine = None):
 		self.directories = directories or []
+		self.index = index if index is not None else ContentIndex(self.directories)
+		self.copy_engine = copy_engine if copy_engine is not None else CopyEngine(self.index)
 		self.missing: Set[str] = set()
+		self.copy_errors: List[CopyError] = []
 		self.extensions = ['.wav', '.mp3', '.ogg']
 		self.entities = [
 			'func_door', 'func_door_rotating',
@@ -39,9 +44,9 @@ class SoundExtractor:
 		]
 
 	# Extract all sound paths from VMF
-	def extract_from_vmf(self, vmf_path: str) -> Set[str]:
-		parser = VMFParser()
-		if not parser.parse_file(vmf_path):
+	def extract_from_vmf(self, vmf: Union[str, VMFParser]) -> Set[str]:
+		parser = load_vmf(vmf, projection=PROJECTION_ENTITIES) if isinstance(vmf, str) else vmf
+		if parser is None:
 			return set()
 
 		sounds = set()
@@ -98,47 +103,46 @@ class SoundExtractor:
 	def _find_single_file(self, sound_path: str) -> Optional[str]:
 		clean_path = sound_path.lower().replace('\\', '/')
 
-		for game_dir in self.directories:
-			paths_to_try = [
-				os.path.join(game_dir, "sound", clean_path),
-				os.path.join(game_dir, clean_path)
-			]
-			
-			for path in paths_to_try:
-				if os.path.exists(path):
-					return path
-
-			if '.' in clean_path:
-				base_path = os.path.splitext(clean_path)[0]
-				for ext in self.extensions:
-					test_path = os.path.join(game_dir, "sound", base_path + ext)
-					if os.path.exists(test_path):
-						return test_path
+		for path in [f"sound/{clean_path}", clean_path]:
+			file_path = self.index.find(path)
+			if file_path:
+				return file_path
 
-		return None
+		if '.' in clean_path:
+			base_path = os.path.splitext(clean_path)[0]
+			for ext in self.extensions:
+				file_path = self.index.find(f"sound/{base_path}{ext}")
+				if file_path:
+					return file_path
 
+		return None
 
-	# Copy found sound files to output directory
-	def copy_to_directory(self, sound_files: Dict[str, str], output_dir: str, preserve_structure: bool = True):
-		os.makedirs(output_dir, exist_ok=True)
+	# (source, relative path) copy jobs for found sound files
+	def get_copy_jobs(self, sound_files: Dict[str, str], preserve_structure: bool = True) -> List[Tuple[str, str]]:
+		jobs = []
 
 		for file_path in sound_files.values():
-			try:
-				if preserve_structure:
-					dest_path = os.path.join(output_dir, self._get_relative_path(file_path))
-					os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-				else:
-					dest_path = os.path.join(output_dir, os.path.basename(file_path))
+			relative_path = self._get_relative_path(file_path) if preserve_structure else os.path.basename(file_path)
+			jobs.append((file_path, relative_path))
 
-				shutil.copy2(file_path, dest_path)
-			except Exception:
-				pass
+		return jobs
+
+	# Copy found sound files to output directory or archive
+	def copy_to_directory(self, sound_files: Dict[str, str], output_dir: Union[str, OutputSink], preserve_structure: bool = True, mode: Optional[str] = None) -> List[CopyError]:
+		jobs = self.get_copy_jobs(sound_files, preserve_structure)
+		errors = self.copy_engine.copy_files(jobs, output_dir, mode)
+		self.copy_errors.extend(errors)
+		return errors
 
 	# Get relative path for sound files
 	def _get_relative_path(self, file_path: str) -> str:
+		# Indexed files know their path under the content root, whatever the case of the asset folder on disk
+		relative_path = self.index.relative_path(file_path)
+		if relative_path is not None:
+			return relative_path
+
 		parts = file_path.replace('\\', '/').split('/')
-		try:
-			idx = parts.index("sound")
-			return '/'.join(parts[idx:])
-		except ValueError:
-			return os.path.basename(file_path)
\ No newline at end of file
+		for idx, part in enumerate(parts):
+			if part.lower() == "sound":
+				return '/'.join(parts[idx:])
+		return os.path.basename(file_path)
\ No newline at end of file
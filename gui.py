@@ -1,14 +1,11 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
-import json
 import threading
-from typing import List, Tuple
 
-from parser_vmf import VMFParser
-from extract_mat import MaterialExtractor
-from extract_mdl import ModelExtractor
-from extract_snd import SoundExtractor
+from pipeline import ContentPathManager, ExtractionPipeline
+from copy_engine import CopyEngine, COPY_MODES
+from output_sink import OUTPUT_FORMATS
 
 # Try to import tkinterdnd2 for proper drag & drop
 try:
@@ -18,57 +15,6 @@ except ImportError:
 	HAS_DND = False
 
 
-class ContentPathManager:
-	def __init__(self):
-		self.paths: List[Tuple[str, str]] = []
-		self.config_file = "paths.json"
-		self.load_config()
-
-	def add_path(self, path: str, path_type: str):
-		if (path, path_type) not in self.paths:
-			self.paths.append((path, path_type))
-			self.save_config()
-
-	def remove_path(self, index: int):
-		if 0 <= index < len(self.paths):
-			del self.paths[index]
-			self.save_config()
-
-	def get_paths_by_type(self, path_type: str) -> List[str]:
-		return [path for path, ptype in self.paths if ptype == path_type]
-
-	def get_all_content_paths(self) -> List[str]:
-		content_paths = []
-
-		for path, path_type in self.paths:
-			if path_type == "content":
-				content_paths.append(path)
-			elif path_type == "addons" and os.path.exists(path):
-				content_paths.extend([
-					os.path.join(path, addon) for addon in os.listdir(path)
-					if os.path.isdir(os.path.join(path, addon))
-				])
-
-		return content_paths
-
-	def save_config(self):
-		try:
-			with open(self.config_file, 'w', encoding='utf-8') as f:
-				json.dump(self.paths, f, indent=2, ensure_ascii=False)
-		except Exception as e:
-			print(f"Save error: {e}")
-
-	def load_config(self):
-		if not os.path.exists(self.config_file):
-			return
-		try:
-			with open(self.config_file, 'r', encoding='utf-8') as f:
-				self.paths = json.load(f)
-		except Exception as e:
-			print(f"Load error: {e}")
-			self.paths = []
-
-
 class VMFExtractorGUI:
 	def __init__(self, root):
 		self.root = root
@@ -106,7 +52,7 @@ class VMFExtractorGUI:
 		ttk.Label(controls_frame, text="Type:").grid(row=0, column=0, sticky=tk.W, padx=(0, 5))
 
 		self.path_type_var = tk.StringVar(value="content")
-		type_combo = ttk.Combobox(controls_frame, textvariable=self.path_type_var, values=["content", "addons"], state="readonly", width=10)
+		type_combo = ttk.Combobox(controls_frame, textvariable=self.path_type_var, values=["content", "addons", "vpk"], state="readonly", width=10)
 		type_combo.grid(row=0, column=1, padx=(0, 10))
 
 		# Path entry (center)
@@ -169,6 +115,29 @@ class VMFExtractorGUI:
 		self.drop_zone.pack(fill=tk.X, pady=(0, 10))
 		self.drop_zone.bind("<Button-1>", self.on_drop_zone_click)
 
+		# Extraction options
+		options_frame = ttk.Frame(drop_frame)
+		options_frame.pack(fill=tk.X)
+
+		ttk.Label(options_frame, text="Copy threads:").pack(side=tk.LEFT, padx=(0, 5))
+		self.copy_workers_var = tk.IntVar(value=CopyEngine.DEFAULT_WORKERS)
+		ttk.Spinbox(options_frame, from_=1, to=64, textvariable=self.copy_workers_var, width=5).pack(side=tk.LEFT, padx=(0, 10))
+
+		ttk.Label(options_frame, text="Output mode:").pack(side=tk.LEFT, padx=(0, 5))
+		self.copy_mode_var = tk.StringVar(value="copy")
+		ttk.Combobox(options_frame, textvariable=self.copy_mode_var, values=list(COPY_MODES), state="readonly", width=10).pack(side=tk.LEFT, padx=(0, 10))
+
+		ttk.Label(options_frame, text="Output:").pack(side=tk.LEFT, padx=(0, 5))
+		self.output_format_var = tk.StringVar(value="folder")
+		ttk.Combobox(options_frame, textvariable=self.output_format_var, values=list(OUTPUT_FORMATS), state="readonly", width=8).pack(side=tk.LEFT, padx=(0, 10))
+
+		self.incremental_var = tk.BooleanVar(value=False)
+		ttk.Checkbutton(options_frame, text="Incremental", variable=self.incremental_var).pack(side=tk.LEFT, padx=(0, 5))
+		self.hash_files_var = tk.BooleanVar(value=False)
+		ttk.Checkbutton(options_frame, text="Hash check", variable=self.hash_files_var).pack(side=tk.LEFT, padx=(0, 5))
+		self.streaming_var = tk.BooleanVar(value=False)
+		ttk.Checkbutton(options_frame, text="Streaming", variable=self.streaming_var).pack(side=tk.LEFT)
+
 		# Extract button (initially disabled)
 		self.extract_button = ttk.Button(drop_frame, text="Select a VMF file first", command=self.start_extraction, state="disabled")
 
@@ -197,7 +166,12 @@ class VMFExtractorGUI:
 		self.drop_zone.bind("<Button-1>", self.on_drop_zone_click)
 
 	def browse_path(self):
-		if path := filedialog.askdirectory(title="Select content folder"):
+		if self.path_type_var.get() == "vpk":
+			path = filedialog.askopenfilename(title="Select VPK archive", filetypes=[("VPK archives", "*_dir.vpk *.vpk"), ("All files", "*.*")])
+		else:
+			path = filedialog.askdirectory(title="Select content folder")
+
+		if path:
 			self.path_entry.delete(0, tk.END)
 			self.path_entry.insert(0, path)
 
@@ -271,40 +245,34 @@ class VMFExtractorGUI:
 
 		content_paths = self.path_manager.get_all_content_paths()
 		if not content_paths:
-			return messagebox.showerror("Error", "No content paths configured.\nAdd at least one 'content' or 'addons' path.")
+			return messagebox.showerror("Error", "No content paths configured.\nAdd at least one 'content', 'addons' or 'vpk' path.")
+
+		try:
+			copy_workers = self.copy_workers_var.get()
+		except tk.TclError:
+			copy_workers = CopyEngine.DEFAULT_WORKERS
 
-		thread = threading.Thread(target=self._extract_vmf_thread, args=(vmf_path, content_paths), daemon=True)
+		copy_mode = self.copy_mode_var.get()
+		output_format = self.output_format_var.get()
+		incremental = self.incremental_var.get()
+		hash_check = self.hash_files_var.get()
+		streaming = self.streaming_var.get()
+
+		thread = threading.Thread(target=self._extract_vmf_thread, args=(vmf_path, content_paths, copy_workers, copy_mode, output_format, incremental, hash_check, streaming), daemon=True)
 		thread.start()
 
-	def _extract_vmf_thread(self, vmf_path, content_paths):
+	def _extract_vmf_thread(self, vmf_path, content_paths, copy_workers=CopyEngine.DEFAULT_WORKERS, copy_mode="copy", output_format="folder", incremental=False, hash_check=False, streaming=False):
 		try:
 			self.extraction_running = True
 			self.root.after(0, lambda: self.extract_button.config(state="disabled"))
 
-			vmf_name = os.path.splitext(os.path.basename(vmf_path))[0]
-			output_dir = f"extracted_{vmf_name}"
-
-			self.log_async(f"Starting extraction: {vmf_name}")
-			self.log_async(f"Content paths: {len(content_paths)}")
-
-			self.log_async("Parsing VMF file...")
-			parser = VMFParser()
-			if not parser.parse_file(vmf_path):
-				raise Exception("Unable to parse VMF file")
-
-			mat_extractor = MaterialExtractor(content_paths)
-			mdl_extractor = ModelExtractor(content_paths)
-			sound_extractor = SoundExtractor(content_paths)
+			pipeline = ExtractionPipeline(
+				content_paths, self.path_manager.index_file, self.path_manager.dependency_cache_file,
+				copy_workers, copy_mode, output_format, incremental, hash_check, streaming, log=self.log_async
+			)
+			result = pipeline.run(vmf_path)
 
-			self._extract_materials(parser, mat_extractor, output_dir)
-			self._extract_skybox(parser, mat_extractor, output_dir)
-			self._extract_models(vmf_path, mdl_extractor, mat_extractor, output_dir)
-			self._extract_sounds(vmf_path, sound_extractor, output_dir)
-
-			self._create_missing_file(output_dir, mat_extractor, mdl_extractor, sound_extractor)
-
-			self.log_async(f"Extraction complete! Folder: {output_dir}")
-			self.root.after(0, lambda: messagebox.showinfo("Success", f"Extraction complete!\n\nContent extracted to:\n{os.path.abspath(output_dir)}"))
+			self.root.after(0, lambda: messagebox.showinfo("Success", f"Extraction complete!\n\nContent extracted to:\n{result['output']}"))
 
 		except Exception as e:
 			error_msg = f"Extraction error: {e}"
@@ -318,58 +286,6 @@ class VMFExtractorGUI:
 	def log_async(self, message):
 		self.root.after(0, lambda: self.log(message))
 
-	# Extract materials from VMF
-	def _extract_materials(self, parser, mat_extractor, output_dir):
-		self.log_async("Extracting materials...")
-		materials = parser.get_all_materials()
-		if materials:
-			material_files = mat_extractor.find_files(materials)
-			if material_files:
-				mat_extractor.copy_to_directory(material_files, output_dir, True)
-			self.log_async(f"Materials: {len(material_files)} found, {len(mat_extractor.missing)} missing")
-
-	# Extract skybox materials from VMF
-	def _extract_skybox(self, parser, mat_extractor, output_dir):
-		self.log_async("Extracting skybox...")
-		skybox_materials = parser.get_skybox_materials()
-		if skybox_materials:
-			skybox_files = mat_extractor.find_files(skybox_materials)
-			if skybox_files:
-				mat_extractor.copy_to_directory(skybox_files, output_dir, True)
-			self.log_async(f"Skybox: {len(skybox_files)} found, {len(skybox_materials) - len(skybox_files)} missing")
-		else:
-			self.log_async("Skybox: No skybox defined in worldspawn")
-
-	# Extract models from VMF
-	def _extract_models(self, vmf_path, mdl_extractor, mat_extractor, output_dir):
-		self.log_async("Extracting models...")
-		models = mdl_extractor.extract_from_vmf(vmf_path)
-		if models:
-			model_files = mdl_extractor.find_files(models)
-			if model_files:
-				mdl_extractor.copy_to_directory(model_files, output_dir, True)
-			self.log_async(f"Models: {len(model_files)} found, {len(mdl_extractor.missing)} missing")
-
-			# Extract materials from models
-			self.log_async("Extracting materials from models...")
-			model_materials = mdl_extractor.extract_materials(model_files)
-			if model_materials:
-				model_material_files = mat_extractor.find_files(model_materials)
-				if model_material_files:
-					mat_extractor.copy_to_directory(model_material_files, output_dir, True)
-				self.log_async(f"Model materials: {len(model_material_files)} found, {len(mat_extractor.missing)} missing")
-
-	# Extract sounds from VMF
-	def _extract_sounds(self, vmf_path, sound_extractor, output_dir):
-		self.log_async("Extracting sounds...")
-		sounds = sound_extractor.extract_from_vmf(vmf_path)
-		if sounds:
-			sound_files = sound_extractor.find_files(sounds)
-			if sound_files:
-				sound_extractor.copy_to_directory(sound_files, output_dir, True)
-
-			self.log_async(f"Sounds: {len(sound_files)} found, {len(sound_extractor.missing)} missing")
-
 	def reset_drop_zone(self):
 		self.selected_vmf = None
 
@@ -384,58 +300,6 @@ class VMFExtractorGUI:
 		self.log_text.insert(tk.END, f"{message}\n")
 		self.log_text.see(tk.END)
 
-	def _create_missing_file(self, output_dir, mat_extractor, mdl_extractor, sound_extractor):
-		try:
-			missing_file_path = os.path.join(output_dir, "missing.txt")
-
-			with open(missing_file_path, 'w', encoding='utf-8') as f:
-				f.write("VMF Content Extractor - Missing Files Report\n")
-				f.write("=" * 50 + "\n\n")
-
-				# Missing materials
-				if mat_extractor.missing:
-					f.write(f"MISSING MATERIALS ({len(mat_extractor.missing)}):\n")
-					f.write("-" * 30 + "\n")
-					for material in sorted(mat_extractor.missing):
-						f.write(f"materials/{material}.vmt\n")
-					f.write("\n")
-
-				# Missing models
-				if mdl_extractor.missing:
-					f.write(f"MISSING MODELS ({len(mdl_extractor.missing)}):\n")
-					f.write("-" * 25 + "\n")
-					for model in sorted(mdl_extractor.missing):
-						f.write(f"models/{model}\n")
-					f.write("\n")
-
-				# Missing sounds
-				if sound_extractor.missing:
-					f.write(f"MISSING SOUNDS ({len(sound_extractor.missing)}):\n")
-					f.write("-" * 25 + "\n")
-					for sound in sorted(sound_extractor.missing):
-						f.write(f"sound/{sound}\n")
-					f.write("\n")
-
-				# Summary
-				total_missing = len(mat_extractor.missing) + len(mdl_extractor.missing) + len(sound_extractor.missing)
-				f.write(f"SUMMARY:\n")
-				f.write("-" * 15 + "\n")
-				f.write(f"Total missing files: {total_missing}\n")
-				f.write(f"- Materials: {len(mat_extractor.missing)}\n")
-				f.write(f"- Models: {len(mdl_extractor.missing)}\n")
-				f.write(f"- Sounds: {len(sound_extractor.missing)}\n")
-
-			if total_missing > 0:
-				self.root.after(0, lambda: self.log(f"Missing files report saved: missing.txt ({total_missing} items)"))
-			else:
-				if os.path.exists(missing_file_path):
-					os.remove(missing_file_path)
-				self.root.after(0, lambda: self.log("All files found! No missing.txt needed."))
-
-		except Exception as e:
-			self.root.after(0, lambda: self.log(f"Error creating missing.txt: {e}"))
-
-
 def main():
 	root = TkinterDnD.Tk() if HAS_DND else tk.Tk()
 	VMFExtractorGUI(root)
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+class Stage:
+	# Init variables
+	def __init__(self, name: str, depth: int, start: float):
+		self.name = name
+		self.depth = depth
+		self.start = start
+		self.end = start
+		self.thread_id = threading.get_ident()
+		self.counters: Dict[str, int] = {}
+
+	@property
+	def seconds(self) -> float:
+		return self.end - self.start
+
+
+class Instrumentation:
+	# Init variables, sample returns the current totals of the counters to attribute to stages
+	def __init__(self, sample: Optional[Callable[[], Dict[str, int]]] = None):
+		self.sample = sample or dict
+		self.stages: List[Stage] = []
+		self.started = time.perf_counter()
+		self._depth = 0
+
+	# Record the wall time of a block and how much each counter moved during it
+	@contextmanager
+	def stage(self, name: str) -> Iterator[Stage]:
+		stage = Stage(name, self._depth, time.perf_counter())
+		self.stages.append(stage)
+		before = self.sample()
+		self._depth += 1
+		try:
+			yield stage
+		finally:
+			self._depth -= 1
+			stage.end = time.perf_counter()
+			after = self.sample()
+			stage.counters = {key: value - before.get(key, 0) for key, value in after.items() if value != before.get(key, 0)}
+
+	# Wall time of each top-level stage
+	def timings(self) -> Dict[str, float]:
+		timings: Dict[str, float] = {}
+		for stage in self.stages:
+			if stage.depth == 0:
+				timings[stage.name] = timings.get(stage.name, 0.0) + stage.seconds
+		return timings
+
+	# Stages as plain data, offsets relative to the start of the run
+	def to_dict(self) -> Dict:
+		return {
+			'total_seconds': round(time.perf_counter() - self.started, 4),
+			'stages': [
+				{
+					'name': stage.name,
+					'depth': stage.depth,
+					'start': round(stage.start - self.started, 4),
+					'seconds': round(stage.seconds, 4),
+					'counters': stage.counters,
+				}
+				for stage in self.stages
+			],
+		}
+
+	# Stages as Chrome trace events (chrome://tracing, Perfetto)
+	def to_chrome_trace(self) -> Dict:
+		pid = os.getpid()
+		return {
+			'traceEvents': [
+				{
+					'name': stage.name,
+					'cat': 'extract',
+					'ph': 'X',
+					'ts': round((stage.start - self.started) * 1e6),
+					'dur': round(stage.seconds * 1e6),
+					'pid': pid,
+					'tid': stage.thread_id,
+					'args': stage.counters,
+				}
+				for stage in self.stages
+			],
+			'displayTimeUnit': 'ms',
+		}
+
+	def save_json(self, path: str):
+		with open(path, 'w', encoding='utf-8') as f:
+			json.dump(self.to_dict(), f, indent=2)
+
+	def save_chrome_trace(self, path: str):
+		with open(path, 'w', encoding='utf-8') as f:
+			json.dump(self.to_chrome_trace(), f)
+
+	# One line per top-level stage for the log
+	def summary(self) -> List[str]:
+		lines = []
+
+		for stage in self.stages:
+			if stage.depth:
+				continue
+
+			details = []
+			counters = stage.counters
+			if counters.get('files_copied'):
+				rate = counters.get('bytes_copied', 0) / stage.seconds if stage.seconds > 0 else 0
+				linked = f" ({counters['files_linked']} linked)" if counters.get('files_linked') else ""
+				details.append(f"{counters['files_copied']} copied{linked}, {format_bytes(counters.get('bytes_copied', 0))} ({format_bytes(rate)}/s)")
+			if counters.get('lookups'):
+				details.append(f"{counters['lookups']} lookups")
+			if counters.get('stat_calls'):
+				details.append(f"{counters['stat_calls']} stat calls")
+			parsed = counters.get('vmts_parsed', 0) + counters.get('mdls_parsed', 0)
+			if parsed:
+				details.append(f"{parsed} assets parsed")
+			cache_lookups = counters.get('cache_hits', 0) + counters.get('cache_misses', 0)
+			if cache_lookups:
+				details.append(f"cache {counters.get('cache_hits', 0) * 100 // cache_lookups}% hits")
+
+			lines.append(f"{stage.name}: {stage.seconds:.3f}s" + (f" ({', '.join(details)})" if details else ""))
+
+		return lines
+
+
+# Human readable byte size
+def format_bytes(size: float) -> str:
+	for unit in ('B', 'KB', 'MB'):
+		if size < 1024:
+			return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+		size /= 1024
+	return f"{size:.1f} GB"
@@ -0,0 +1,119 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Dict, Optional, Set
+from content_index import ContentIndex
+
+
+class CopyManifest:
+	FILE_NAME = ".extract_manifest.json"
+	VERSION = 1
+	HASH_CHUNK_SIZE = 1 << 20
+
+	# Init variables
+	def __init__(self, output_dir: str, index: Optional[ContentIndex] = None, hash_files: bool = False):
+		self.output_dir = output_dir
+		self.index = index
+		self.hash_files = hash_files
+		self.path = os.path.join(output_dir, self.FILE_NAME)
+		self.previous: Dict[str, Dict] = {}
+		self.entries: Dict[str, Dict] = {}
+		self._lock = threading.Lock()
+		self.load()
+
+	# Load the manifest of the previous run, if any
+	def load(self):
+		try:
+			with open(self.path, 'r', encoding='utf-8') as f:
+				data = json.load(f)
+			if data.get('version') == self.VERSION:
+				self.previous = data.get('files', {})
+		except (OSError, ValueError):
+			self.previous = {}
+
+	# Size and mtime of a source file (loose or inside a VPK)
+	def _stat(self, source: str):
+		if self.index is not None:
+			return self.index.stat(source)
+
+		stat = os.stat(source)
+		return stat.st_size, stat.st_mtime_ns
+
+	# Content hash of a source file
+	def _hash(self, source: str) -> str:
+		digest = hashlib.sha1()
+		with (self.index.open(source) if self.index is not None else open(source, 'rb')) as f:
+			while chunk := f.read(self.HASH_CHUNK_SIZE):
+				digest.update(chunk)
+		return digest.hexdigest()
+
+	# Check if dest is already an up to date output of source, and keep it referenced if so
+	def is_current(self, relative_path: str, source: str, mode: str) -> bool:
+		entry = self.previous.get(relative_path)
+		if not entry or entry.get('source') != source or entry.get('mode') != mode:
+			return False
+		if not os.path.lexists(os.path.join(self.output_dir, relative_path)):
+			return False
+
+		size, mtime = self._stat(source)
+		if entry.get('size') != size:
+			return False
+
+		if entry.get('mtime') != mtime:
+			# Touched but possibly identical: only the hash can tell
+			if not self.hash_files or entry.get('hash') != self._hash(source):
+				return False
+			entry = dict(entry, mtime=mtime)
+
+		with self._lock:
+			self.entries[relative_path] = entry
+		return True
+
+	# Record a freshly written output
+	def record(self, relative_path: str, source: str, mode: str):
+		size, mtime = self._stat(source)
+		entry = {'source': source, 'size': size, 'mtime': mtime, 'mode': mode}
+		if self.hash_files:
+			entry['hash'] = self._hash(source)
+
+		with self._lock:
+			self.entries[relative_path] = entry
+
+	# Delete outputs of the previous run that this run no longer references, then save
+	def finish(self) -> Set[str]:
+		removed = set()
+
+		for relative_path in set(self.previous) - set(self.entries):
+			dest = os.path.join(self.output_dir, relative_path)
+			try:
+				os.remove(dest)
+				removed.add(relative_path)
+				self._remove_empty_parents(os.path.dirname(dest))
+			except FileNotFoundError:
+				removed.add(relative_path)
+			except OSError:
+				# Still on disk, keep tracking it so a later run retries
+				self.entries[relative_path] = self.previous[relative_path]
+
+		self.save()
+		self.previous = dict(self.entries)
+		return removed
+
+	# Remove directories emptied by stale file removal, up to the output folder
+	def _remove_empty_parents(self, directory: str):
+		output_dir = os.path.abspath(self.output_dir)
+		directory = os.path.abspath(directory)
+
+		while directory != output_dir and directory.startswith(output_dir):
+			try:
+				os.rmdir(directory)
+			except OSError:
+				return
+			directory = os.path.dirname(directory)
+
+	# Write the manifest to the output folder
+	def save(self):
+		os.makedirs(self.output_dir, exist_ok=True)
+		with open(self.path, 'w', encoding='utf-8') as f:
+			json.dump({'version': self.VERSION, 'files': self.entries}, f, indent=1, sort_keys=True)
@@ -0,0 +1,33 @@
+import struct
+from typing import List
+
+from parser_mdl import STUDIO_LAYOUTS, TEXTURE_ENTRY_SIZE
+
+
+# Build a minimal version 48 MDL whose texture table names the given textures
+def build_mdl(textures: List[str], cd_directories: List[str]) -> bytes:
+	layout = STUDIO_LAYOUTS[48]
+	header_size = layout.struct.size
+	texture_index = header_size
+	cd_index = texture_index + TEXTURE_ENTRY_SIZE * len(textures)
+	strings_index = cd_index + 4 * len(cd_directories)
+
+	strings = bytearray()
+	texture_table = bytearray()
+	for i, texture in enumerate(textures):
+		entry = bytearray(TEXTURE_ENTRY_SIZE)
+		struct.pack_into('<i', entry, 0, strings_index + len(strings) - (texture_index + i * TEXTURE_ENTRY_SIZE))
+		texture_table += entry
+		strings += texture.encode('ascii') + b'\0'
+
+	cd_table = bytearray()
+	for cd_directory in cd_directories:
+		cd_table += struct.pack('<i', strings_index + len(strings))
+		strings += cd_directory.encode('ascii') + b'\0'
+
+	values = dict.fromkeys(layout.fields, 0)
+	values.update(
+		id=b'IDST', version=48, name=b'synthetic.mdl', length=strings_index + len(strings),
+		numtextures=len(textures), textureindex=texture_index, numcdtextures=len(cd_directories), cdtextureindex=cd_index,
+	)
+	return layout.struct.pack(*(values[field] for field in layout.fields)) + texture_table + cd_table + strings
@@ -0,0 +1,198 @@
+import os
+import threading
+import zipfile
+import zlib
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Dict, List, Set, Tuple
+from vpk import VPKArchive
+
+
+class OutputSink(ABC):
+	COPY_CHUNK_SIZE = 1 << 20
+
+	# Init variables
+	def __init__(self, path: str):
+		self.path = path
+		self.written = 0
+		self.names: Set[str] = set()
+		self.closed = False
+		self._lock = threading.Lock()
+
+	# Stream a source file into the sink under a relative path (e.g. "materials/foo.vmt")
+	@abstractmethod
+	def add(self, relative_path: str, source: BinaryIO):
+		pass
+
+	# Add in-memory data (reports, manifests) under a relative path
+	@abstractmethod
+	def add_bytes(self, relative_path: str, data: bytes):
+		pass
+
+	# Reserve a name in the archive, False if it was already written (call with the lock held)
+	def _claim(self, relative_path: str) -> bool:
+		name = relative_path.replace('\\', '/').lower()
+		if name in self.names:
+			return False
+		self.names.add(name)
+		return True
+
+	# Finish the archive
+	def close(self):
+		pass
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+
+class ZipSink(OutputSink):
+	# Init variables
+	def __init__(self, path: str, compression: int = zipfile.ZIP_DEFLATED):
+		super().__init__(path)
+		self.archive = zipfile.ZipFile(path, 'w', compression=compression)
+
+	# Stream a source file into the zip, one entry at a time
+	def add(self, relative_path: str, source: BinaryIO):
+		name = relative_path.replace('\\', '/')
+		with self._lock:
+			if not self._claim(name):
+				return
+
+			# The size isn't known up front, zip64 headers let an entry grow past 2 GiB
+			with self.archive.open(name, 'w', force_zip64=True) as dest:
+				while chunk := source.read(self.COPY_CHUNK_SIZE):
+					dest.write(chunk)
+			self.written += 1
+
+	# Add in-memory data to the zip
+	def add_bytes(self, relative_path: str, data: bytes):
+		with self._lock:
+			if not self._claim(relative_path):
+				return
+
+			self.archive.writestr(relative_path.replace('\\', '/'), data)
+			self.written += 1
+
+	# Write the central directory
+	def close(self):
+		with self._lock:
+			self.archive.close()
+			self.closed = True
+
+
+class VPKSink(OutputSink):
+	# Split archives like Valve's tools do
+	MAX_ARCHIVE_SIZE = 200 * 1024 * 1024
+
+	# Init variables
+	def __init__(self, path: str):
+		super().__init__(path)
+		if path.lower().endswith('_dir.vpk'):
+			self.base = path[:-8]
+		elif path.lower().endswith('.vpk'):
+			self.base = path[:-4]
+		else:
+			self.base = path
+
+		# extension -> directory -> [(filename, crc, archive_index, offset, length)]
+		self.tree: Dict[str, Dict[str, List[Tuple[str, int, int, int, int]]]] = {}
+		self.archive_index = -1
+		self.archive_file = None
+		self.archive_offset = 0
+
+	# Path of the directory file read back by VPKArchive
+	@property
+	def dir_path(self) -> str:
+		return f"{self.base}_dir.vpk"
+
+	# Start a new numbered data archive
+	def _next_archive(self):
+		if self.archive_file:
+			self.archive_file.close()
+
+		self.archive_index += 1
+		self.archive_file = open(f"{self.base}_{self.archive_index:03d}.vpk", 'wb')
+		self.archive_offset = 0
+
+	# Stream a source file into the current data archive and record its entry
+	def add(self, relative_path: str, source: BinaryIO):
+		with self._lock:
+			if not self._claim(relative_path):
+				return
+
+			if self.archive_file is None or self.archive_offset >= self.MAX_ARCHIVE_SIZE:
+				self._next_archive()
+
+			crc = 0
+			length = 0
+			while chunk := source.read(self.COPY_CHUNK_SIZE):
+				crc = zlib.crc32(chunk, crc)
+				length += len(chunk)
+				self.archive_file.write(chunk)
+
+			self._add_entry(relative_path, crc, self.archive_index, self.archive_offset, length)
+			self.archive_offset += length
+			self.written += 1
+
+	# Add in-memory data to the current data archive
+	def add_bytes(self, relative_path: str, data: bytes):
+		with self._lock:
+			if not self._claim(relative_path):
+				return
+
+			if self.archive_file is None or self.archive_offset >= self.MAX_ARCHIVE_SIZE:
+				self._next_archive()
+
+			self.archive_file.write(data)
+			self._add_entry(relative_path, zlib.crc32(data), self.archive_index, self.archive_offset, len(data))
+			self.archive_offset += len(data)
+			self.written += 1
+
+	# Record a file under its extension / directory / name
+	def _add_entry(self, relative_path: str, crc: int, archive_index: int, offset: int, length: int):
+		directory, name = os.path.split(relative_path.replace('\\', '/').lower())
+		filename, extension = os.path.splitext(name)
+		self.tree.setdefault(extension[1:] or ' ', {}).setdefault(directory or ' ', []).append(
+			(filename, crc, archive_index, offset, length))
+
+	# Write the directory file once every entry is known
+	def close(self):
+		with self._lock:
+			if self.closed:
+				return
+			self.closed = True
+
+			if self.archive_file:
+				self.archive_file.close()
+				self.archive_file = None
+
+			tree = bytearray()
+			for extension, directories in self.tree.items():
+				tree += extension.encode('utf-8') + b'\0'
+				for directory, files in directories.items():
+					tree += directory.encode('utf-8') + b'\0'
+					for filename, crc, archive_index, offset, length in files:
+						tree += filename.encode('utf-8') + b'\0'
+						tree += VPKArchive.ENTRY.pack(crc, 0, archive_index, offset, length, 0xffff)
+					tree += b'\0'
+				tree += b'\0'
+			tree += b'\0'
+
+			with open(self.dir_path, 'wb') as f:
+				f.write(VPKArchive.HEADER_V1.pack(VPKArchive.SIGNATURE, 1, len(tree)))
+				f.write(tree)
+
+
+# Output kinds selectable for an extraction
+OUTPUT_FORMATS = ('folder', 'zip', 'vpk')
+
+
+# Open a sink for an archive output path, based on its extension
+def open_sink(path: str) -> OutputSink:
+	if path.lower().endswith('.zip'):
+		return ZipSink(path)
+	if path.lower().endswith('.vpk'):
+		return VPKSink(path)
+	raise ValueError(f"Unsupported archive output: {path}")
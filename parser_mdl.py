@@ -1,164 +1,310 @@
+import re
+import mmap
 import struct
-from typing import Set
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple, Union
+
+
+# eyeposition, illumposition, hull_min, hull_max, view_bbmin, view_bbmax
+_VECTOR_FIELDS = tuple(
+	f"{vector}_{axis}"
+	for vector in ('eyeposition', 'illumposition', 'hull_min', 'hull_max', 'view_bbmin', 'view_bbmax')
+	for axis in 'xyz'
+)
+
+# studiohdr_t fields shared by every supported version, from numbones to includemodelindex
+_STUDIOHDR_FIELDS = (
+	'numbones', 'boneindex', 'numbonecontrollers', 'bonecontrollerindex', 'numhitboxsets', 'hitboxsetindex',
+	'numlocalanim', 'localanimindex', 'numlocalseq', 'localseqindex', 'activitylistversion', 'eventsindexed',
+	'numtextures', 'textureindex', 'numcdtextures', 'cdtextureindex',
+	'numskinref', 'numskinfamilies', 'skinindex', 'numbodyparts', 'bodypartindex',
+	'numlocalattachments', 'localattachmentindex', 'numlocalnodes', 'localnodeindex', 'localnodenameindex',
+	'numflexdesc', 'flexdescindex', 'numflexcontrollers', 'flexcontrollerindex', 'numflexrules', 'flexruleindex',
+	'numikchains', 'ikchainindex', 'nummouths', 'mouthindex', 'numlocalposeparameters', 'localposeparamindex',
+	'surfacepropindex', 'keyvalueindex', 'keyvaluesize', 'numlocalikautoplaylocks', 'localikautoplaylockindex',
+	'mass', 'contents', 'numincludemodels', 'includemodelindex',
+)
+
+
+class StudioHeader(NamedTuple):
+	version: int
+	length: int
+	numtextures: int
+	textureindex: int
+	numcdtextures: int
+	cdtextureindex: int
+	numskinref: int
+	numskinfamilies: int
+	skinindex: int
+	keyvalueindex: int
+	keyvaluesize: int
+	numincludemodels: int
+	includemodelindex: int
+
+
+# Everything a model pulls in besides its own files
+class ModelDependencies(NamedTuple):
+	materials: Set[str]
+	include_models: Set[str]
+	models: Set[str]
+
+
+class StudioLayout:
+	# Init variables
+	def __init__(self, prefix: str, prefix_fields: Tuple[str, ...]):
+		self.struct = struct.Struct('<' + prefix + '18fi43if3i')
+		self.fields = prefix_fields + _VECTOR_FIELDS + ('flags',) + _STUDIOHDR_FIELDS
+
+	# Unpack the header fields needed for dependency extraction
+	def unpack(self, data) -> StudioHeader:
+		values = dict(zip(self.fields, self.struct.unpack_from(data, 0)))
+		return StudioHeader(**{name: values[name] for name in StudioHeader._fields})
+
+
+# Header layout per studiohdr_t version
+_LAYOUT_SOURCE = StudioLayout('4sii64si', ('id', 'version', 'checksum', 'name', 'length'))
+_LAYOUT_V53 = StudioLayout('4siii64si', ('id', 'version', 'checksum', 'sznameindex', 'name', 'length'))
+STUDIO_LAYOUTS: Dict[int, StudioLayout] = {
+	# Source 2004-2013 (44-49) and Titanfall (52)
+	44: _LAYOUT_SOURCE, 45: _LAYOUT_SOURCE, 46: _LAYOUT_SOURCE, 47: _LAYOUT_SOURCE,
+	48: _LAYOUT_SOURCE, 49: _LAYOUT_SOURCE, 52: _LAYOUT_SOURCE,
+	# Titanfall 2 (53) stores sznameindex after checksum
+	53: _LAYOUT_V53,
+}
+
+# mstudiotexture_t is 64 bytes and starts with sznameindex (relative to the entry)
+TEXTURE_ENTRY_SIZE = 64
+MAX_TEXTURES = 5000
+MAX_CD_TEXTURES = 500
+
+# Texture and cdtexture names: path characters only, no empty path components,
+# starting with a letter or digit and not ending with '-' or '_'
+MIN_NAME_LENGTH = 2
+MAX_NAME_LENGTH = 150
+_NAME_PATTERN = re.compile(rb'(?!.*(?://|\\\\))[A-Za-z0-9][A-Za-z0-9_\-/\\]*[A-Za-z0-9/\\]')
+_REJECTED_NAME_PATTERN = re.compile(
+	rb'http|www|system32|windows|documents|temp|debug|\\x|null|void|class|function', re.IGNORECASE)
+_ALNUM_BYTES = b'0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+# mstudiomodelgroup_t is { szlabelindex, sznameindex }, both relative to the entry
+INCLUDE_MODEL_ENTRY_SIZE = 8
+MAX_INCLUDE_MODELS = 64
+MAX_KEYVALUE_SIZE = 1 << 20
+
+# Model names are full paths ("models/humans/male_shared.mdl")
+_MODEL_NAME_PATTERN = re.compile(rb'[A-Za-z0-9_\-/\\. ]+\.mdl', re.IGNORECASE)
+
+# Any quoted .mdl value in $keyvalues text (prop_data, physgun_interactions, ...)
+_KEYVALUE_MODEL_PATTERN = re.compile(rb'"([^"\r\n]+?\.mdl)"', re.IGNORECASE)
+
+# phyheader_t: size, id, solidCount, checkSum, followed by the solids then $collisiontext
+_PHY_HEADER = struct.Struct('<iiii')
+_PHY_BREAK_PATTERN = re.compile(rb'(?<![A-Za-z_])break\s*\{([^}]*)\}', re.IGNORECASE)
+_PHY_MODEL_PATTERN = re.compile(rb'"model"\s*"([^"\r\n]+)"', re.IGNORECASE)
+MAX_PHY_SOLIDS = 128
+
+_VERSION = struct.Struct('<4si')
 
 
 class MDLParser:
 	def __init__(self):
 		pass
 
-	# Extract materials from a MDL file
-	def extract_materials_from_mdl(self, mdl_path: str) -> Set[str]:
-		data = open(mdl_path, 'rb').read()
+	# Extract materials, $includemodel models and keyvalue models from a MDL file
+	def extract_dependencies_from_mdl(self, mdl_path: str) -> ModelDependencies:
+		try:
+			with open(mdl_path, 'rb') as f:
+				with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+					return self._parse_dependencies(data)
+		except (OSError, ValueError):
+			return ModelDependencies(set(), set(), set())
+
+	# Extract dependencies from MDL file contents already in memory
+	def extract_dependencies_from_data(self, data: bytes) -> ModelDependencies:
+		return self._parse_dependencies(data)
+
+	# Extract gib models from the break sections of a PHY file's collision text
+	def extract_gibs_from_phy(self, phy_path: str) -> Set[str]:
+		try:
+			with open(phy_path, 'rb') as f:
+				return self.extract_gibs_from_data(f.read())
+		except OSError:
+			return set()
+
+	# Extract gib models from PHY file contents already in memory
+	def extract_gibs_from_data(self, data: bytes) -> Set[str]:
+		if len(data) < _PHY_HEADER.size:
+			return set()
+
+		header_size, _, solid_count, _ = _PHY_HEADER.unpack_from(data, 0)
+		if not _PHY_HEADER.size <= header_size < len(data) or not 0 <= solid_count <= MAX_PHY_SOLIDS:
+			return set()
+
+		# Each solid is prefixed with its size, the text section follows the last one
+		pos = header_size
+		for _ in range(solid_count):
+			if pos + 4 > len(data):
+				return set()
+			pos += 4 + struct.unpack_from('<i', data, pos)[0]
+
+		gibs = set()
+		for block in _PHY_BREAK_PATTERN.finditer(data, pos):
+			for model in _PHY_MODEL_PATTERN.findall(block.group(1)):
+				gibs.add(self._clean_model_name(model.decode('latin-1')))
+
+		gibs.discard('')
+		return gibs
+
+	# Normalize a gib model reference ("props_junk/gib01" or "models/props_junk/gib01.mdl")
+	def _clean_model_name(self, name: str) -> str:
+		name = name.strip().lower().replace('\\', '/').lstrip('/')
+		if not name:
+			return ''
+		if not name.startswith('models/'):
+			name = f"models/{name}"
+		if not name.endswith('.mdl'):
+			name = f"{name}.mdl"
+		return name
+
+	# Read the studiohdr_t header, None if the data is not a supported MDL
+	def read_header(self, data: Union[bytes, mmap.mmap]) -> Optional[StudioHeader]:
+		if len(data) < _VERSION.size:
+			return None
+
+		ident, version = _VERSION.unpack_from(data, 0)
+		layout = STUDIO_LAYOUTS.get(version)
+		if ident != b'IDST' or layout is None or len(data) < layout.struct.size:
+			return None
 
-		return self._parse_mdl_simple(data)
+		try:
+			return layout.unpack(data)
+		except struct.error:
+			return None
 
-	# Simple MDL parser to extract material names
-	def _parse_mdl_simple(self, data: bytes) -> Set[str]:
-		materials = set()
+	# Combine every cdtexture directory with every texture name
+	def _parse_mdl(self, data: Union[bytes, mmap.mmap]) -> Set[str]:
+		header = self.read_header(data)
+		if header is None:
+			return set()
 
-		try:
-			if len(data) < 200 or data[0:4] != b'IDST':
-				return materials
+		cd_directories = self._read_cd_directories(data, header)
+		texture_names = self._read_texture_names(data, header)
 
-			offsets_to_try = [
-				(204, 208, 212, 216),
-				(148, 152, 156, 160),
-				(200, 204, 208, 212),
-				(220, 224, 228, 232),
-			]
+		materials = set()
+		for cd_dir in cd_directories:
+			for texture_name in texture_names:
+				if not texture_name.startswith('/'):
+					materials.add(f"{cd_dir}/{texture_name}")
+				else:
+					materials.add(f"{cd_dir}{texture_name}")
 
-			best_result = set()
+		return materials
 
-			for num_tex_offset, tex_idx_offset, num_cd_offset, cd_idx_offset in offsets_to_try:
-				if len(data) < cd_idx_offset + 4:
-					continue
+	# Materials plus the models referenced by $includemodel and $keyvalues
+	def _parse_dependencies(self, data: Union[bytes, mmap.mmap]) -> ModelDependencies:
+		header = self.read_header(data)
+		if header is None:
+			return ModelDependencies(set(), set(), set())
+
+		return ModelDependencies(
+			self._parse_mdl(data),
+			set(self._read_include_models(data, header)),
+			self._read_keyvalue_models(data, header)
+		)
+
+	# Read the model paths from the mstudiomodelgroup_t table
+	def _read_include_models(self, data: Union[bytes, mmap.mmap], header: StudioHeader) -> List[str]:
+		if not 0 < header.numincludemodels <= MAX_INCLUDE_MODELS or header.includemodelindex <= 0:
+			return []
+
+		count = min(header.numincludemodels, (len(data) - header.includemodelindex) // INCLUDE_MODEL_ENTRY_SIZE)
+		if count <= 0:
+			return []
+
+		name_indexes = struct.unpack_from('<' + '4xi' * count, data, header.includemodelindex)
+		offsets = [header.includemodelindex + i * INCLUDE_MODEL_ENTRY_SIZE + name_index for i, name_index in enumerate(name_indexes)]
+
+		return [
+			name.lower().replace('\\', '/').lstrip('/')
+			for name in self._read_names(data, offsets, self._is_valid_model_name)
+		]
 
-				try:
-					numtextures = struct.unpack('<I', data[num_tex_offset:num_tex_offset+4])[0]
-					textureindex = struct.unpack('<I', data[tex_idx_offset:tex_idx_offset+4])[0]  
-					numcdtextures = struct.unpack('<I', data[num_cd_offset:num_cd_offset+4])[0]
-					cdtextureindex = struct.unpack('<I', data[cd_idx_offset:cd_idx_offset+4])[0]
+	# Read the .mdl paths quoted in the $keyvalues text
+	def _read_keyvalue_models(self, data: Union[bytes, mmap.mmap], header: StudioHeader) -> Set[str]:
+		start = header.keyvalueindex
+		if start <= 0 or not 0 < header.keyvaluesize <= MAX_KEYVALUE_SIZE or start >= len(data):
+			return set()
 
-					if (0 < numtextures <= 5000 and 0 < textureindex < len(data) and
-						0 <= numcdtextures <= 1000 and (cdtextureindex == 0 or cdtextureindex < len(data))):
+		text = data[start:start + header.keyvaluesize]
+		return {
+			self._clean_model_name(name.decode('latin-1'))
+			for name in _KEYVALUE_MODEL_PATTERN.findall(text)
+			if self._is_valid_model_name(name)
+		}
 
-						current_materials = self._extract_textures_from_offsets(
-							data, numtextures, textureindex, numcdtextures, cdtextureindex)
+	# Read the texture names from the mstudiotexture_t table
+	def _read_texture_names(self, data: Union[bytes, mmap.mmap], header: StudioHeader) -> List[str]:
+		if not 0 < header.numtextures <= MAX_TEXTURES or header.textureindex <= 0:
+			return []
 
-						if len(current_materials) > len(best_result):
-							best_result = current_materials
+		count = min(header.numtextures, (len(data) - header.textureindex) // TEXTURE_ENTRY_SIZE)
+		if count <= 0:
+			return []
 
-				except Exception:
-					continue
+		# Every entry's sznameindex in one unpack, skipping the rest of each 64-byte entry
+		name_indexes = struct.unpack_from('<' + 'i60x' * count, data, header.textureindex)
+		offsets = [header.textureindex + i * TEXTURE_ENTRY_SIZE + name_index for i, name_index in enumerate(name_indexes)]
 
-			materials.update(best_result)
+		return [name.lower().replace('\\', '/') for name in self._read_names(data, offsets, self._is_valid_material_name)]
 
-		except Exception:
-			pass
+	# Read the material search directories from the cdtexture offset table
+	def _read_cd_directories(self, data: Union[bytes, mmap.mmap], header: StudioHeader) -> List[str]:
+		if not 0 < header.numcdtextures <= MAX_CD_TEXTURES or header.cdtextureindex <= 0:
+			return []
 
-		return materials
+		count = min(header.numcdtextures, (len(data) - header.cdtextureindex) // 4)
+		if count <= 0:
+			return []
 
-	# Extract texture names from given offsets
-	def _extract_textures_from_offsets(self, data: bytes, numtextures: int, textureindex: int, numcdtextures: int, cdtextureindex: int) -> Set[str]:
-		materials = set()
+		offsets = struct.unpack_from(f'<{count}i', data, header.cdtextureindex)
 
 		cd_directories = []
-		if numcdtextures > 0 and cdtextureindex > 0 and cdtextureindex < len(data):
-			for i in range(min(numcdtextures, 500)):
-				cdtex_offset = cdtextureindex + (i * 4)
-
-				if cdtex_offset + 4 <= len(data):
-					nameoffset = struct.unpack('<I', data[cdtex_offset:cdtex_offset+4])[0]
-
-					if 0 < nameoffset < len(data) - 4:
-						name = self._read_null_terminated_string(data, nameoffset)
-						if name and len(name) > 0 and self._is_valid_material_name(name):
-							clean_name = name.lower().replace('\\', '/').rstrip('/')
-							if len(clean_name) > 0:
-								cd_directories.append(clean_name)
-
-		texture_names = []
-		if numtextures > 0 and textureindex > 0 and textureindex < len(data):
-			for i in range(min(numtextures, 5000)):
-				texture_offset = textureindex + (i * 64)
-
-				if texture_offset + 64 <= len(data):
-					sznameindex = struct.unpack('<I', data[texture_offset:texture_offset+4])[0]
-
-					name_offsets_to_try = [
-						texture_offset + sznameindex,
-						sznameindex,
-						textureindex + sznameindex,
-					]
-
-					for name_offset in name_offsets_to_try:
-						if 0 < name_offset < len(data) - 4:
-							name = self._read_null_terminated_string(data, name_offset)
-							if name and len(name) > 0 and self._is_valid_material_name(name):
-								clean_name = name.lower().replace('\\', '/')
-								texture_names.append(clean_name)
-								break
-
-		if cd_directories and texture_names:
-			for cd_dir in cd_directories:
-				for texture_name in texture_names:
-					if not texture_name.startswith('/'):
-						full_path = f"{cd_dir}/{texture_name}"
-					else:
-						full_path = f"{cd_dir}{texture_name}"
-
-					materials.add(full_path)
+		for name in self._read_names(data, offsets, self._is_valid_material_name):
+			clean_name = name.lower().replace('\\', '/').rstrip('/')
+			if clean_name:
+				cd_directories.append(clean_name)
 
-		return materials
+		return cd_directories
 
-	# Validate material name based on strict criteria
-	def _is_valid_material_name(self, name: str) -> bool:
-		if not name or len(name) < 2 or len(name) > 150:
-			return False
+	# Read the null-terminated names at the given offsets that pass is_valid
+	def _read_names(self, data: Union[bytes, mmap.mmap], offsets, is_valid: Callable[[bytes], bool]) -> List[str]:
+		names = []
+		size = len(data)
 
-		if not all(32 <= ord(c) <= 126 for c in name):
-			return False
+		for offset in offsets:
+			if not 0 < offset < size:
+				continue
 
-		allowed_chars = set('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-/\\')
-		if not all(c in allowed_chars for c in name):
-			return False
+			end = data.find(b'\0', offset, offset + MAX_NAME_LENGTH + 1)
+			if end < 0:
+				continue
 
-		alnum_count = sum(1 for c in name if c.isalnum())
-		if alnum_count < len(name) * 0.3:
-			return False
+			name = data[offset:end]
+			if is_valid(name):
+				names.append(name.decode('ascii'))
 
-		bad_patterns = [
-			'http', 'www', '.exe', '.dll', '.bat', '.cmd', 'system32', 
-			'program files', 'windows', 'documents', 'temp', 'debug',
-			'\\x', '\x00', '\xff', 'null', 'void', 'class', 'function'
-		]
-		name_lower = name.lower()
-		if any(bad in name_lower for bad in bad_patterns):
-			return False
+		return names
 
-		if name.startswith(('.', '-', '_', '\\', '/')) or name.endswith(('.', '-', '_')):
+	# Validate material name based on strict criteria
+	def _is_valid_material_name(self, name: bytes) -> bool:
+		if not MIN_NAME_LENGTH <= len(name) <= MAX_NAME_LENGTH or not _NAME_PATTERN.fullmatch(name):
 			return False
 
-		if '//' in name or '\\\\' in name:
+		# At least 30% letters and digits
+		if len(name.translate(None, _ALNUM_BYTES)) > len(name) * 0.7:
 			return False
 
-		return True
-
-	# Read null-terminated ASCII string from data at given offset
-	def _read_null_terminated_string(self, data: bytes, offset: int) -> str:
-		if offset >= len(data):
-			return ""
-
-		end = offset
-		while end < len(data) and data[end] != 0:
-			if data[end] < 32 or data[end] > 126:
-				return ""
-			end += 1
+		return not _REJECTED_NAME_PATTERN.search(name)
 
-		if end - offset < 2:
-			return ""
-
-		try:
-			return data[offset:end].decode('ascii', errors='strict')
-		except (UnicodeDecodeError, UnicodeError):
-			return ""
\ No newline at end of file
+	# Validate a model path from the includemodel table or keyvalues
+	def _is_valid_model_name(self, name: bytes) -> bool:
+		return len(name) <= MAX_NAME_LENGTH and _MODEL_NAME_PATTERN.fullmatch(name) is not None
@@ -1,222 +1,551 @@
+import io
+import os
 import re
-from typing import Dict, List, Set, Optional
+import mmap
+import sys
+import threading
+import multiprocessing
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import chain, islice, repeat
+from operator import length_hint
+from typing import Dict, FrozenSet, Iterator, List, NamedTuple, Set, Optional, TextIO, Tuple, Union
 from dataclasses import dataclass
 
 
-@dataclass
+# Tokenizer events: (event, key, value)
+EVENT_OPEN = 0		# key = block name ("world", "entity", "solid", ...)
+EVENT_CLOSE = 1
+EVENT_KEY = 2		# key/value property pair
+
+VMFEvent = Tuple[int, Optional[str], Optional[Union[str, bytes]]]
+
+
+# Slotted dataclasses where supported (Python 3.10+)
+_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+# Array type code of interned material IDs
+MATERIAL_ID_TYPE = 'I'
+
+
+@dataclass(**_SLOTS)
 class VMFEntity:
 	classname: str
 	properties: Dict[str, str]
 	id: Optional[str] = None
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class VMFSide:
 	material: str
 	properties: Dict[str, str]
 
 
-@dataclass
+# One brush: the material of each side as IDs into VMFParser.material_names,
+# full sides (plane, uaxis, vaxis, ...) only when the parser keeps properties
+@dataclass(**_SLOTS)
 class VMFBrush:
 	id: Optional[str]
-	sides: List[VMFSide]
+	material_ids: array
+	sides: Optional[List[VMFSide]] = None
 
 
-class VMFParser:
+# What a parser keeps of a map. brushes: world and entity brush sides; classnames: only these entities
+# are kept (their brushes still count); keys: only these entity properties are kept besides classname and id.
+# Names are matched case-insensitively. Any projection also skips editor and connections blocks.
+class VMFProjection(NamedTuple):
+	brushes: bool = True
+	classnames: Optional[FrozenSet[str]] = None
+	keys: Optional[FrozenSet[str]] = None
+
+
+# Everything asset extraction reads, editor data and entity I/O skipped
+PROJECTION_ASSETS = VMFProjection()
+# Brush materials plus overlay and decal materials
+PROJECTION_MATERIALS = VMFProjection(classnames=frozenset({'info_overlay', 'infodecal'}), keys=frozenset({'material', 'texture'}))
+# Entities only (models, sounds), no brushes
+PROJECTION_ENTITIES = VMFProjection(brushes=False)
+
+
+class VMFTokenizer:
+	CHUNK_SIZE = 1 << 20
+
 	# Init variables
-	def __init__(self):
+	def __init__(self, stream: TextIO, chunk_size: int = CHUNK_SIZE):
+		self.stream = stream
+		self.chunk_size = chunk_size
+
+	def __iter__(self) -> Iterator[VMFEvent]:
+		return self.events()
+
+	# Skip the rest of the block just opened: called by the consumer right after an open event,
+	# the block's content and its close event are never yielded
+	def skip_block(self):
+		self._skip = True
+
+	# Read the stream chunk by chunk and yield open/close/key events
+	def events(self) -> Iterator[VMFEvent]:
+		read = self.stream.read
+		chunk_size = self.chunk_size
+		pending_name = ''
+		depth = 0
+		skip_depth = 0
+		tail = ''
+		self._skip = False
+
+		while True:
+			chunk = read(chunk_size)
+			# Leading newline: every line, the first included, follows one (see _skip_lines)
+			buffer = '\n' + tail + chunk
+			lines = buffer.split('\n')
+			tail = lines.pop() if chunk else ''
+			end = len(buffer) - len(tail)
+			count = len(lines)
+			remaining = iter(lines)
+
+			# Offset of lines[known] in buffer, only worked out when a block is skipped
+			known = offset = 0
+			if skip_depth:
+				skip_depth, offset, known = _skip_lines(buffer, offset, end, skip_depth, known, count)
+				next(islice(remaining, known, known), None)
+
+			for line in remaining:
+				line = line.strip()
+				if not line:
+					continue
+
+				first = line[0]
+				if first == '"':
+					# "key" "value"
+					key_end = line.find('"', 1)
+					if key_end > 0 and line.startswith(' "', key_end + 1):
+						value_end = line.find('"', key_end + 3)
+						if value_end >= 0:
+							yield EVENT_KEY, line[1:key_end], line[key_end + 3:value_end]
+				elif first == '{' and len(line) == 1:
+					depth += 1
+					yield EVENT_OPEN, pending_name, None
+					pending_name = ''
+					if self._skip:
+						self._skip = False
+						depth -= 1
+						i = count - length_hint(remaining)
+						offset += sum(map(len, lines[known:i])) + i - known
+						skip_depth, offset, known = _skip_lines(buffer, offset, end, 1, i, count)
+						next(islice(remaining, known - i, known - i), None)
+				elif first == '}' and len(line) == 1:
+					if depth > 0:
+						depth -= 1
+						yield EVENT_CLOSE, None, None
+				elif not line.startswith('//'):
+					pending_name = line
+
+			if not chunk:
+				break
+
+		# Close blocks left open by a truncated file so what was read is kept
+		for _ in range(depth):
+			yield EVENT_CLOSE, None, None
+
+
+# A line holding only an opening or closing brace, with the newline before it (quoted values never span lines)
+_BRACE_LINE = re.compile(r'\n[^\S\n]*([{}])[^\S\n]*(?![^\n])')
+
+
+# Jump over brace-matched lines of buffer[offset:end] without tokenizing them, returns the depth
+# still open at end (0 once the block closed), the new offset and line index
+def _skip_lines(buffer: str, offset: int, end: int, skip_depth: int, i: int, count: int) -> Tuple[int, int, int]:
+	for match in _BRACE_LINE.finditer(buffer, offset - 1, end):
+		skip_depth += 1 if match.group(1) == '{' else -1
+		if skip_depth == 0:
+			line_end = match.end()
+			if line_end >= end:
+				return 0, end, count
+			return 0, line_end + 1, i + buffer.count('\n', offset, line_end + 1)
+
+	return skip_depth, end, count
+
+
+# One token per line of a mapped VMF: "key" "value", a lone brace, or a block name (after the newline before it)
+_TOKEN_BODY = rb'[ \t]*(?:"([^"\n]*)" "([^"\n]*)"|([{}])[ \t\r]*(?![^\n])|([A-Za-z_][^"\r\n]*?)[ \t\r]*(?![^\n]))'
+_TOKEN = re.compile(rb'\n' + _TOKEN_BODY)
+_FIRST_TOKEN = re.compile(_TOKEN_BODY)
+_BRACE_LINE_BYTES = re.compile(_BRACE_LINE.pattern.encode())
+_BOM = b'\xef\xbb\xbf'
+
+
+class VMFByteTokenizer:
+	# Init variables, data is the raw file content (bytes or mmap)
+	def __init__(self, data):
+		self.data = data
+		self._skip = False
+
+		# Set once the events are consumed: closing braces without an open block, blocks left open
+		self.unmatched = 0
+		self.unclosed = 0
+
+	def __iter__(self) -> Iterator[VMFEvent]:
+		return self.events()
+
+	# Same as VMFTokenizer.skip_block
+	def skip_block(self):
+		self._skip = True
+
+	# Values are yielded undecoded, the consumer decodes only those it keeps
+	@staticmethod
+	def decode(value: bytes) -> str:
+		return value.decode('utf-8', errors='ignore')
+
+	# Scan the raw bytes with one regex and yield open/close/key events, key and block names decoded once each
+	def events(self) -> Iterator[VMFEvent]:
+		data = self.data
+		names: Dict[bytes, str] = {}
+		pending_name = ''
+		depth = 0
+		self._skip = False
+		self.unmatched = self.unclosed = 0
+
+		start = len(_BOM) if data[:len(_BOM)] == _BOM else 0
+		first = _FIRST_TOKEN.match(data, start)
+		tokens = _TOKEN.finditer(data, start)
+
+		while tokens is not None:
+			matches = tokens if first is None else _chain_first(first, tokens)
+			first = tokens = None
+
+			for match in matches:
+				raw_key, value, brace, raw_name = match.groups()
+				if raw_key is not None:
+					key = names.get(raw_key)
+					if key is None:
+						key = names[raw_key] = raw_key.decode('utf-8', errors='ignore')
+					yield EVENT_KEY, key, value
+				elif brace == b'{':
+					depth += 1
+					yield EVENT_OPEN, pending_name, None
+					pending_name = ''
+					if self._skip:
+						self._skip = False
+						depth -= 1
+						# Resume at the newline after the block's closing brace
+						position = _skip_bytes(data, match.end())
+						tokens = _TOKEN.finditer(data, position)
+						break
+				elif brace is not None:
+					if depth > 0:
+						depth -= 1
+						yield EVENT_CLOSE, None, None
+					else:
+						self.unmatched += 1
+				else:
+					pending_name = names.get(raw_name)
+					if pending_name is None:
+						pending_name = names[raw_name] = raw_name.decode('utf-8', errors='ignore')
+
+		# Close blocks left open by a truncated file so what was read is kept
+		self.unclosed = depth
+		for _ in range(depth):
+			yield EVENT_CLOSE, None, None
+
+
+def _chain_first(first, tokens):
+	yield first
+	yield from tokens
+
+
+# Position right after the line closing the block opened just before position, or the end of data
+def _skip_bytes(data, position: int) -> int:
+	depth = 1
+	for match in _BRACE_LINE_BYTES.finditer(data, position):
+		depth += 1 if match.group(1) == b'{' else -1
+		if depth == 0:
+			return match.end()
+	return len(data)
+
+
+# Parsed maps keyed by (path, mtime, size, keep_properties, projection), shared by every extractor in the run
+_PARSE_CACHE_SIZE = 4
+_parse_cache: Dict[Tuple[str, int, int, bool, Optional[VMFProjection]], 'VMFParser'] = {}
+_parse_cache_lock = threading.Lock()
+
+
+# Block roles while walking the event stream
+_ROLE_SKIP = 0
+_ROLE_WORLD = 1
+_ROLE_ENTITY = 2
+_ROLE_SOLID = 3
+_ROLE_SIDE = 4
+# Top-level hidden block: Hammer wraps hidden entities and solids in it, its children are read as if it wasn't there
+_ROLE_HIDDEN = 5
+
+
+class VMFParser:
+	# Files smaller than this are not worth starting worker processes for
+	PARALLEL_THRESHOLD = 32 << 20
+	RANGES_PER_WORKER = 4
+
+	# Init variables, keep_properties retains every side property instead of only its material,
+	# projection limits what is kept to what the caller needs
+	def __init__(self, keep_properties: bool = False, projection: Optional[VMFProjection] = None):
+		self.keep_properties = keep_properties
+		self.projection = projection
 		self.entities: List[VMFEntity] = []
 		self.brushes: List[VMFBrush] = []
 		self.world_brushes: List[VMFBrush] = []
 		self.worldspawn_properties: Dict[str, str] = {}
 
-	# Parse VMF file
-	def parse_file(self, vmf_path: str) -> bool:
+		# Interned side materials, brushes store indices into material_names
+		self.material_names: List[str] = []
+		self._material_ids: Dict[Union[str, bytes], int] = {}
+
+	# ID of a side material (text or raw bytes), added to the table on first use
+	def _intern_material(self, material: Union[str, bytes]) -> int:
+		material_id = self._material_ids.get(material)
+		if material_id is None:
+			material_id = self._material_ids[material] = len(self.material_names)
+			self.material_names.append(material if isinstance(material, str) else VMFByteTokenizer.decode(material))
+		return material_id
+
+	# Build a brush from fully parsed sides
+	def _create_brush(self, brush_id: Optional[str], sides: List[VMFSide]) -> VMFBrush:
+		material_ids = array(MATERIAL_ID_TYPE, [self._intern_material(side.material) for side in sides])
+		return VMFBrush(id=brush_id, material_ids=material_ids, sides=sides if self.keep_properties else None)
+
+	# Whether this parse holds everything a parse with these options would
+	def covers(self, keep_properties: bool = False, projection: Optional[VMFProjection] = None) -> bool:
+		if keep_properties and not self.keep_properties:
+			return False
+		if self.projection is None:
+			return True
+		if projection is None:
+			return False
+		return ((self.projection.brushes or not projection.brushes) and
+				_includes(self.projection.classnames, projection.classnames) and
+				_includes(self.projection.keys, projection.keys))
+
+	# Materials of a brush's sides, in side order
+	def get_brush_materials(self, brush: VMFBrush) -> List[str]:
+		material_names = self.material_names
+		return [material_names[material_id] for material_id in brush.material_ids]
+
+	# Parse VMF file, mapped scans the memory-mapped raw bytes instead of reading decoded text,
+	# workers > 1 splits large files across that many processes
+	def parse_file(self, vmf_path: str, mapped: bool = False, workers: int = 1) -> bool:
 		try:
-			with open(vmf_path, 'r', encoding='utf-8', errors='ignore') as f:
-				content = f.read()
+			if workers > 1 and os.path.getsize(vmf_path) >= self.PARALLEL_THRESHOLD and self._parse_parallel(vmf_path, workers):
+				return True
+
+			if mapped:
+				self._parse_mapped(vmf_path)
+				return True
 
-			self._parse_content(content)
+			with open(vmf_path, 'r', encoding='utf-8', errors='ignore') as f:
+				self._parse_events(VMFTokenizer(f))
 			return True
 
 		except Exception as e:
 			print(f"Error parsing VMF file: {e}")
 			return False
 
-	# Parse the content of the VMF file
-	def _parse_content(self, content: str):
-		lines = content.split('\n')
-		lines = [line.strip() for line in lines if line.strip() and not line.strip().startswith('//')]
-
-		i = 0
-		while i < len(lines):
-			line = lines[i]
-
-			if line == 'world':
-				i = self._parse_world_section(lines, i + 1)
-			elif line == 'entity':
-				entity, i = self._parse_entity_section(lines, i + 1)
-				if entity:
-					self.entities.append(entity)
-			else:
-				i += 1
-
-	# Parse the world section to extract brushes and worldspawn properties
-	def _parse_world_section(self, lines: List[str], start_idx: int) -> int:
-		i = start_idx
-
-		if i < len(lines) and lines[i] == '{':
-			i += 1
-
-		brace_count = 1
-
-		while i < len(lines) and brace_count > 0:
-			line = lines[i]
-
-			if line == '{':
-				brace_count += 1
-			elif line == '}':
-				brace_count -= 1
-			elif line == 'solid':
-				brush, i = self._parse_brush_section(lines, i + 1)
-				if brush:
-					self.world_brushes.append(brush)
-				continue
-			elif '"' in line:
-				# Parse worldspawn properties (like skyname)
-				key, value = self._parse_property_line(line)
-				if key and value:
-					self.worldspawn_properties[key] = value
-
-			i += 1
-
-		return i
-
-	# Parse an entity section to extract properties and brushes
-	def _parse_entity_section(self, lines: List[str], start_idx: int) -> tuple[Optional[VMFEntity], int]:
-		i = start_idx
-		properties = {}
-		brushes = []
-
-		if i < len(lines) and lines[i] == '{':
-			i += 1
-
-		brace_count = 1
-
-		while i < len(lines) and brace_count > 0:
-			line = lines[i]
-
-			if line == '{':
-				brace_count += 1
-			elif line == '}':
-				brace_count -= 1
-			elif line == 'solid':
-				brush, i = self._parse_brush_section(lines, i + 1)
-				if brush:
-					brushes.append(brush)
-				continue
-			elif '"' in line:
-				key, value = self._parse_property_line(line)
-				if key and value:
-					properties[key] = value
-
-			i += 1
-
-		classname = properties.get('classname')
-		if classname:
-			entity_id = properties.get('id')
-			entity = VMFEntity(classname=classname, properties=properties, id=entity_id)
-
-			self.brushes.extend(brushes)
-
-			return entity, i
-
-		return None, i
-
-	# Parse a brush section to extract sides
-	def _parse_brush_section(self, lines: List[str], start_idx: int) -> tuple[Optional[VMFBrush], int]:
-		i = start_idx
-		sides = []
-		brush_id = None
-
-		if i < len(lines) and lines[i] == '{':
-			i += 1
-
-		brace_count = 1
-
-		while i < len(lines) and brace_count > 0:
-			line = lines[i]
-
-			if line == '{':
-				brace_count += 1
-			elif line == '}':
-				brace_count -= 1
-			elif line == 'side':
-				side, i = self._parse_side_section(lines, i + 1)
-				if side:
-					sides.append(side)
-				continue
-			elif '"id"' in line:
-				_, brush_id = self._parse_property_line(line)
-
-			i += 1
+	# Parse a memory-mapped VMF, the file is never decoded or copied as a whole
+	def _parse_mapped(self, vmf_path: str):
+		with open(vmf_path, 'rb') as f:
+			if os.fstat(f.fileno()).st_size == 0:
+				return
+			with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+				# Read ahead aggressively, the file is scanned once front to back
+				if hasattr(mmap, 'MADV_SEQUENTIAL'):
+					data.madvise(mmap.MADV_SEQUENTIAL)
+				self._parse_events(VMFByteTokenizer(data))
+
+	# Parse independent byte ranges of the file in worker processes and merge them in file order,
+	# returns False if the workers could not run
+	def _parse_parallel(self, vmf_path: str, workers: int) -> bool:
+		with open(vmf_path, 'rb') as f:
+			with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+				ranges = split_vmf(data, workers * self.RANGES_PER_WORKER)
+		if len(ranges) < 2:
+			return False
 
-		if sides:
-			return VMFBrush(id=brush_id, sides=sides), i
-
-		return None, i
-
-	# Parse a side section to extract material and properties
-	def _parse_side_section(self, lines: List[str], start_idx: int) -> tuple[Optional[VMFSide], int]:
-		i = start_idx
-		properties = {}
-
-		if i < len(lines) and lines[i] == '{':
-			i += 1
-
-		brace_count = 1
-
-		while i < len(lines) and brace_count > 0:
-			line = lines[i]
-
-			if line == '{':
-				brace_count += 1
-			elif line == '}':
-				brace_count -= 1
-			elif '"' in line:
-				key, value = self._parse_property_line(line)
-				if key and value:
-					properties[key] = value
+		starts, ends, in_world = zip(*ranges)
+		closes_world = [not next_in_world for next_in_world in in_world[1:]] + [True]
+		try:
+			# Spawned like the MDL workers, results come back in file order
+			with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), mp_context=multiprocessing.get_context('spawn')) as executor:
+				results = list(executor.map(_parse_range, repeat(vmf_path), starts, ends, in_world, closes_world,
+											repeat(self.keep_properties), repeat(self.projection)))
+		except (OSError, BrokenProcessPool) as e:
+			print(f"Parallel VMF parsing failed, parsing serially: {e}")
+			return False
 
-			i += 1
+		if not all(balanced for _, balanced in results):
+			print("VMF blocks are not laid out as Hammer writes them, parsing serially")
+			return False
+
+		for part, _ in results:
+			self._merge(part)
+		return True
 
-		material = properties.get('material', '')
-		if material:
-			return VMFSide(material=material, properties=properties), i
+	# Append a parser of a later part of the same file, its material IDs remapped to this table
+	def _merge(self, part: 'VMFParser'):
+		mapping = [self._intern_material(material) for material in part.material_names]
+		if mapping != list(range(len(mapping))):
+			for brush in chain(part.world_brushes, part.brushes):
+				brush.material_ids = array(MATERIAL_ID_TYPE, [mapping[material_id] for material_id in brush.material_ids])
 
-		return None, i
+		self.entities.extend(part.entities)
+		self.world_brushes.extend(part.world_brushes)
+		self.brushes.extend(part.brushes)
+		self.worldspawn_properties.update(part.worldspawn_properties)
 
-	# Parse a property line to extract key and value
-	def _parse_property_line(self, line: str) -> tuple[Optional[str], Optional[str]]:
-		match = re.match(r'"([^"]*)" "([^"]*)"', line)
-		if match:
-			return match.group(1), match.group(2)
-		return None, None
+	# Parse the content of the VMF file
+	def _parse_content(self, content: str):
+		self._parse_events(VMFTokenizer(io.StringIO(content)))
+
+	# Build entities and brushes from the tokenizer events
+	def _parse_events(self, events: Iterator[VMFEvent]):
+		# One role per open block; nested blocks inherit their parent's role
+		stack: List[int] = []
+		world_properties = self.worldspawn_properties
+		keep_properties = self.keep_properties
+		intern_material = self._intern_material
+
+		# Blocks whose content is never needed are jumped over by the tokenizer
+		skip_block = getattr(events, 'skip_block', None)
+		# Byte tokenizers leave values undecoded until they are kept
+		decode = getattr(events, 'decode', None)
+		projection = self.projection
+		keep_brushes = projection is None or projection.brushes
+		skip_names = {'dispinfo'} if projection is None else {'dispinfo', 'editor', 'connections', 'solid'}
+		classnames = keys = None
+		if projection is not None:
+			if projection.classnames is not None:
+				classnames = {classname.lower() for classname in projection.classnames}
+			if projection.keys is not None:
+				keys = {key.lower() for key in projection.keys} | {'classname', 'id'}
+
+		entity_properties: Dict[str, str] = {}
+		entity_brushes: List[VMFBrush] = []
+		brush_id: Optional[str] = None
+		brush_materials = array(MATERIAL_ID_TYPE)
+		brush_sides: List[VMFSide] = []
+		side_properties: Dict[str, str] = {}
+		side_material = ''
+
+		for event, key, value in events:
+			if event == EVENT_KEY:
+				if not stack:
+					continue
+
+				role = stack[-1]
+				if role == _ROLE_SIDE:
+					if keep_properties:
+						if key and value:
+							side_properties[key] = value if decode is None else decode(value)
+					elif key == 'material':
+						# Interned undecoded, each distinct material is decoded once
+						side_material = value
+				elif role == _ROLE_SOLID:
+					if key == 'id':
+						brush_id = value if decode is None else decode(value)
+				elif role == _ROLE_ENTITY:
+					if key and value and (keys is None or key.lower() in keys):
+						entity_properties[key] = value if decode is None else decode(value)
+				elif role == _ROLE_WORLD:
+					# Worldspawn properties (like skyname)
+					if key and value:
+						world_properties[key] = value if decode is None else decode(value)
+
+			elif event == EVENT_OPEN:
+				parent = stack[-1] if stack else None
+
+				if parent is None:
+					if key == 'world':
+						role = _ROLE_WORLD
+					elif key == 'entity':
+						role = _ROLE_ENTITY
+						entity_properties = {}
+						entity_brushes = []
+					elif key == 'hidden':
+						role = _ROLE_HIDDEN
+					else:
+						role = _ROLE_SKIP
+				elif parent == _ROLE_HIDDEN and key == 'entity':
+					role = _ROLE_ENTITY
+					entity_properties = {}
+					entity_brushes = []
+				elif key == 'solid' and (parent == _ROLE_WORLD or parent == _ROLE_ENTITY or parent == _ROLE_HIDDEN):
+					role = _ROLE_SOLID
+					brush_id = None
+					brush_materials = array(MATERIAL_ID_TYPE)
+					brush_sides = []
+				elif key == 'side' and parent == _ROLE_SOLID:
+					role = _ROLE_SIDE
+					side_properties = {}
+					side_material = ''
+				elif parent == _ROLE_HIDDEN:
+					role = _ROLE_SKIP
+				else:
+					role = parent
+
+				if skip_block is not None and (role == _ROLE_SKIP or key in skip_names) and self._can_skip(key, role, parent, keep_brushes):
+					skip_block()
+					continue
+
+				stack.append(role)
+
+			elif stack:
+				role = stack.pop()
+				parent = stack[-1] if stack else None
+				if role == parent:
+					continue
+
+				if role == _ROLE_SIDE:
+					material = side_properties.get('material', '') if keep_properties else side_material
+					if material:
+						brush_materials.append(intern_material(material))
+						if keep_properties:
+							brush_sides.append(VMFSide(material=material, properties=side_properties))
+				elif role == _ROLE_SOLID:
+					if brush_materials:
+						brush = VMFBrush(id=brush_id, material_ids=brush_materials, sides=brush_sides if keep_properties else None)
+						if parent == _ROLE_WORLD or parent == _ROLE_HIDDEN:
+							self.world_brushes.append(brush)
+						else:
+							entity_brushes.append(brush)
+				elif role == _ROLE_ENTITY:
+					classname = entity_properties.get('classname')
+					if classname:
+						if classnames is None or classname.lower() in classnames:
+							entity_id = entity_properties.get('id')
+							self.entities.append(VMFEntity(classname=classname, properties=entity_properties, id=entity_id))
+						self.brushes.extend(entity_brushes)
+
+	# Whether a block just opened can be skipped without reading it
+	def _can_skip(self, name: Optional[str], role: int, parent: Optional[int], keep_brushes: bool) -> bool:
+		if role == _ROLE_SKIP:
+			# versioninfo, visgroups, viewsettings, cameras, cordons...
+			return True
+		if role == _ROLE_SOLID and parent != _ROLE_SOLID:
+			return not keep_brushes
+		if name == 'dispinfo':
+			return parent == _ROLE_SIDE and not self.keep_properties
+		if name == 'editor' or name == 'connections':
+			return parent == _ROLE_ENTITY and self.projection is not None
+		return False
 
 	# Get all materials referenced
 	def get_all_materials(self) -> Set[str]:
-		materials = set()
-
 		# Extract materials from brush faces (world geometry and entity brushes)
+		material_ids = set()
 		for brush in self.world_brushes:
-			for side in brush.sides:
-				if side.material:
-					materials.add(side.material.lower())
-
+			material_ids.update(brush.material_ids)
 		for brush in self.brushes:
-			for side in brush.sides:
-				if side.material:
-					materials.add(side.material.lower())
+			material_ids.update(brush.material_ids)
+
+		material_names = self.material_names
+		materials = {material_names[material_id].lower() for material_id in material_ids}
 
 		# Extract materials from overlay and decal entities
 		for entity in self.entities:
@@ -280,4 +609,108 @@ class VMFParser:
 			material_path = f"skybox/{skyname}_{suffix}"
 			skybox_materials.add(material_path.lower())
 
-		return skybox_materials
\ No newline at end of file
+		return skybox_materials
+
+
+# Parse one range of split_vmf in a worker process, returns the parser and whether the range's
+# braces balanced as the split expected (closes_world: the next range starts inside the world block)
+def _parse_range(vmf_path: str, start: int, end: int, in_world: bool, closes_world: bool,
+				 keep_properties: bool, projection: Optional[VMFProjection]) -> Tuple[VMFParser, bool]:
+	with open(vmf_path, 'rb') as f:
+		f.seek(start)
+		data = f.read(end - start)
+
+	# Ranges inside the world block start between two of its children, reopen it around them
+	tokenizer = VMFByteTokenizer(b'world\n{' + data if in_world else data)
+	parser = VMFParser(keep_properties, projection)
+	parser._parse_events(tokenizer)
+	parser._material_ids = {}
+	return parser, tokenizer.unmatched == 0 and tokenizer.unclosed == (0 if closes_world else 1)
+
+
+# The name line and opening brace of the world block (never the first line, versioninfo comes first)
+_WORLD_OPEN = re.compile(rb'\n[^\S\n]*world[^\S\n]*\r?\n[^\S\n]*\{')
+# A line closing a top-level block (not indented) or one of its children (one tab), as Hammer writes them
+_CUT_LINE = re.compile(rb'\n(\t?)\}\r?(?=\n)')
+
+
+# Split a VMF into about count byte ranges (start, end, in_world) that parse independently: cuts fall
+# right after the closing line of a top-level block or of a child of the world block (in_world).
+# Block depth is read from Hammer's tab indentation, nothing is tokenized; workers check the result.
+def split_vmf(data, count: int) -> List[Tuple[int, int, bool]]:
+	size = len(data)
+	world = _WORLD_OPEN.search(data)
+	world_start = world.end() if world else size
+	world_end = data.find(b'\n}', world_start) if world else size
+	if world_end < 0:
+		world_end = size
+
+	cuts = [(0, False)]
+	position = 0
+	for k in range(1, count):
+		target = max(size * k // count, position)
+		match = _CUT_LINE.search(data, target)
+		while match is not None and match.group(1) and not world_start <= match.start() < world_end:
+			match = _CUT_LINE.search(data, match.end())
+		if match is None:
+			break
+		position = match.end()
+		if position > cuts[-1][0]:
+			cuts.append((position, bool(match.group(1))))
+
+	ends = [cut for cut, _ in cuts[1:]] + [size]
+	return [(start, end, in_world) for (start, in_world), end in zip(cuts, ends)]
+
+
+# Whether a projection name filter keeps at least what another one does (None keeps everything)
+def _includes(names: Optional[FrozenSet[str]], other: Optional[FrozenSet[str]]) -> bool:
+	if names is None:
+		return True
+	return other is not None and {name.lower() for name in other} <= {name.lower() for name in names}
+
+
+# Parse a VMF file once and return the shared parser for as long as the file is unchanged (mapped, workers: see parse_file)
+def load_vmf(vmf_path: str, keep_properties: bool = False, projection: Optional[VMFProjection] = None, mapped: bool = False,
+			 workers: int = 1, cache: bool = True) -> Optional[VMFParser]:
+	# Callers that keep the parser themselves don't need it held in the cache for the life of the process
+	if not cache:
+		parser = VMFParser(keep_properties, projection)
+		return parser if parser.parse_file(vmf_path, mapped, workers) else None
+
+	path = os.path.abspath(vmf_path)
+	try:
+		stat = os.stat(path)
+	except OSError as e:
+		print(f"Error parsing VMF file: {e}")
+		return None
+
+	key = (path, stat.st_mtime_ns, stat.st_size, keep_properties, projection)
+
+	with _parse_cache_lock:
+		parser = _parse_cache.get(key)
+		if parser is not None:
+			return parser
+
+		# A broader parse of the same file (all properties, no projection) serves narrower requests too
+		for cached_key, cached_parser in _parse_cache.items():
+			if cached_key[:3] == key[:3] and cached_parser.covers(keep_properties, projection):
+				return cached_parser
+
+		parser = VMFParser(keep_properties, projection)
+		if not parser.parse_file(path, mapped, workers):
+			return None
+
+		# Drop stale entries for the same path and keep the cache small
+		for cached_key in [k for k in _parse_cache if k[0] == path and k[1:3] != key[1:3]]:
+			del _parse_cache[cached_key]
+		while len(_parse_cache) >= _PARSE_CACHE_SIZE:
+			del _parse_cache[next(iter(_parse_cache))]
+
+		_parse_cache[key] = parser
+		return parser
+
+
+# Drop every cached parse
+def clear_vmf_cache():
+	with _parse_cache_lock:
+		_parse_cache.clear()
@@ -0,0 +1,323 @@
+import os
+import json
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from parser_vmf import VMFParser, load_vmf, PROJECTION_ASSETS
+from extract_mat import MaterialExtractor
+from extract_mdl import ModelExtractor
+from extract_snd import SoundExtractor
+from content_index import ContentIndex
+from copy_engine import CopyEngine
+from dependency_cache import DependencyCache
+from output_sink import OutputSink, open_sink
+from report import REPORT_NAME, write_missing_report
+from instrumentation import Instrumentation
+from streaming import StreamingExtraction
+
+
+class ContentPathManager:
+	def __init__(self, config_file: str = "paths.json"):
+		self.paths: List[Tuple[str, str]] = []
+		self.config_file = config_file
+		self.index_file = os.path.join(os.path.dirname(os.path.abspath(self.config_file)), "content_index.db")
+		self.dependency_cache_file = os.path.join(os.path.dirname(os.path.abspath(self.config_file)), "dependency_cache.db")
+		self.load_config()
+
+	def add_path(self, path: str, path_type: str):
+		if (path, path_type) not in self.paths:
+			self.paths.append((path, path_type))
+			self.save_config()
+
+	def remove_path(self, index: int):
+		if 0 <= index < len(self.paths):
+			del self.paths[index]
+			self.save_config()
+
+	def get_paths_by_type(self, path_type: str) -> List[str]:
+		return [path for path, ptype in self.paths if ptype == path_type]
+
+	def get_all_content_paths(self) -> List[str]:
+		content_paths = []
+
+		for path, path_type in self.paths:
+			if path_type == "content":
+				content_paths.append(path)
+			elif path_type == "vpk" and os.path.isfile(path):
+				content_paths.append(path)
+			elif path_type == "addons" and os.path.exists(path):
+				content_paths.extend([
+					os.path.join(path, addon) for addon in os.listdir(path)
+					if os.path.isdir(os.path.join(path, addon))
+				])
+
+		return content_paths
+
+	def save_config(self):
+		try:
+			with open(self.config_file, 'w', encoding='utf-8') as f:
+				json.dump(self.paths, f, indent=2, ensure_ascii=False)
+		except Exception as e:
+			print(f"Save error: {e}")
+
+	def load_config(self):
+		if not os.path.exists(self.config_file):
+			return
+		try:
+			with open(self.config_file, 'r', encoding='utf-8') as f:
+				self.paths = json.load(f)
+		except Exception as e:
+			print(f"Load error: {e}")
+			self.paths = []
+
+
+class ExtractionPipeline:
+	# Init variables
+	def __init__(self, content_paths: List[str], index_file: Optional[str] = None, dependency_cache_file: Optional[str] = None,
+				 copy_workers: int = CopyEngine.DEFAULT_WORKERS, copy_mode: str = "copy", output_format: str = "folder",
+				 incremental: bool = False, hash_files: bool = False, streaming: bool = False, parse_workers: Optional[int] = None,
+				 log: Callable[[str], None] = print):
+		self.content_paths = content_paths
+		self.index_file = index_file
+		self.dependency_cache_file = dependency_cache_file
+		self.copy_workers = copy_workers
+		self.copy_mode = copy_mode
+		self.output_format = output_format
+		self.incremental = incremental
+		self.hash_files = hash_files
+		self.streaming = streaming
+		self.parse_workers = max(1, parse_workers if parse_workers is not None else (os.cpu_count() or 1))
+		self.log = log
+		self.instrumentation: Optional[Instrumentation] = None
+
+	# Extract everything a VMF uses, returns a JSON-serializable summary of the run
+	def run(self, vmf_path: str, output: Optional[str] = None) -> Dict:
+		vmf_name = os.path.splitext(os.path.basename(vmf_path))[0]
+		output = output or f"extracted_{vmf_name}"
+		found: Dict[str, List[str]] = {'materials': [], 'models': [], 'sounds': []}
+		output_dir: Union[str, OutputSink, None] = None
+		dependency_cache = None
+
+		try:
+			if self.output_format == "folder":
+				output_dir = output
+				output_name = output
+			else:
+				# Stream straight into the archive, nothing is staged on disk
+				output_dir = open_sink(f"{output}.{self.output_format}")
+				output_name = getattr(output_dir, 'dir_path', output_dir.path)
+
+			self.log(f"Starting extraction: {vmf_name}")
+			self.log(f"Content paths: {len(self.content_paths)}")
+
+			# Created up front (the index is only built in its stage) so every stage samples the same counters
+			content_index = ContentIndex(self.content_paths, self.index_file)
+			copy_engine = CopyEngine(content_index, self.copy_workers, self.copy_mode, self.incremental, self.hash_files)
+			dependency_cache = DependencyCache(self.dependency_cache_file) if self.dependency_cache_file else None
+			mat_extractor = MaterialExtractor(self.content_paths, content_index, copy_engine, dependency_cache)
+			mdl_extractor = ModelExtractor(self.content_paths, content_index, copy_engine, self.parse_workers, dependency_cache)
+			sound_extractor = SoundExtractor(self.content_paths, content_index, copy_engine)
+			instrumentation = self.instrumentation = Instrumentation(
+				lambda: self._sample(content_index, copy_engine, mat_extractor, mdl_extractor, dependency_cache))
+
+			self.log("Parsing VMF file...")
+			with instrumentation.stage('parse'):
+				parser = load_vmf(vmf_path, projection=PROJECTION_ASSETS, workers=self.parse_workers, cache=False)
+			if parser is None:
+				raise Exception("Unable to parse VMF file")
+
+			self.log("Indexing content paths...")
+			with instrumentation.stage('index'):
+				content_index.build()
+			self.log(f"Indexed files: {len(content_index)} ({len(content_index.rescanned)} of {len(self.content_paths)} paths rescanned)")
+
+			if self.streaming:
+				with instrumentation.stage('stream'):
+					found = self._extract_streaming(parser, mat_extractor, mdl_extractor, sound_extractor, copy_engine, output_dir)
+			else:
+				with instrumentation.stage('materials'):
+					found['materials'] += self._extract_materials(parser, mat_extractor, output_dir)
+				with instrumentation.stage('skybox'):
+					found['materials'] += self._extract_skybox(parser, mat_extractor, output_dir)
+				with instrumentation.stage('models'):
+					model_jobs, model_material_jobs = self._extract_models(parser, mdl_extractor, mat_extractor, output_dir)
+					found['models'] += model_jobs
+					found['materials'] += model_material_jobs
+				with instrumentation.stage('sounds'):
+					found['sounds'] += self._extract_sounds(parser, sound_extractor, output_dir)
+
+			if dependency_cache is not None:
+				self.log(f"Dependency cache: {dependency_cache.hits} assets reused, {dependency_cache.misses} parsed")
+
+			with instrumentation.stage('finish'):
+				if copy_engine.incremental:
+					copy_engine.finish()
+					self.log(f"Incremental: {copy_engine.skipped} unchanged, {copy_engine.removed} stale files removed")
+				linked = f" ({copy_engine.linked} linked)" if copy_engine.linked else ""
+				self.log(f"Copied files ({self.copy_mode}): {copy_engine.copied}{linked}, {len(copy_engine.errors)} errors")
+				if copy_engine.fallbacks:
+					self.log(f"{copy_engine.fallbacks} files could not be linked and were copied instead")
+
+				total_missing = self._create_missing_file(output_dir, mat_extractor, mdl_extractor, sound_extractor, copy_engine)
+				if isinstance(output_dir, OutputSink):
+					output_dir.close()
+
+			self.log("Stage summary:")
+			for line in instrumentation.summary():
+				self.log(f"  {line}")
+			self.log(f"Extraction complete! Output: {output_name}")
+
+			metrics = instrumentation.to_dict()
+			timings = instrumentation.timings()
+			timings['total'] = metrics['total_seconds']
+
+			return {
+				'vmf': vmf_path,
+				'output': os.path.abspath(output_name),
+				'found': {kind: sorted(set(paths)) for kind, paths in found.items()},
+				'missing': {
+					'materials': sorted(mat_extractor.missing),
+					'models': sorted(mdl_extractor.missing),
+					'sounds': sorted(sound_extractor.missing),
+				},
+				'unparsable_models': sorted(mdl_extractor.unparsable),
+				'copy_errors': [error._asdict() for error in sorted(copy_engine.errors)],
+				'total_missing': total_missing,
+				'copied': copy_engine.copied,
+				'skipped': copy_engine.skipped,
+				'removed': copy_engine.removed,
+				'linked': copy_engine.linked,
+				'fallbacks': copy_engine.fallbacks,
+				'bytes_copied': copy_engine.bytes_copied,
+				'timings': {stage: round(seconds, 4) for stage, seconds in timings.items()},
+				'stages': metrics['stages'],
+			}
+
+		finally:
+			if isinstance(output_dir, OutputSink):
+				output_dir.close()
+			if dependency_cache is not None:
+				dependency_cache.close()
+
+	# Extract materials from VMF, returns the copied relative paths
+	def _extract_materials(self, parser: VMFParser, mat_extractor: MaterialExtractor, output_dir) -> List[str]:
+		self.log("Extracting materials...")
+		materials = mat_extractor.extract_from_vmf(parser)
+		if not materials:
+			return []
+
+		with self.instrumentation.stage('materials/resolve'):
+			material_files = mat_extractor.find_files(materials)
+		jobs = mat_extractor.get_copy_jobs(material_files)
+		if material_files:
+			with self.instrumentation.stage('materials/copy'):
+				mat_extractor.copy_to_directory(material_files, output_dir, True)
+		self.log(f"Materials: {len(material_files)} found, {len(mat_extractor.missing)} missing")
+		return [relative_path for _, relative_path in jobs]
+
+	# Extract skybox materials from VMF, returns the copied relative paths
+	def _extract_skybox(self, parser: VMFParser, mat_extractor: MaterialExtractor, output_dir) -> List[str]:
+		self.log("Extracting skybox...")
+		skybox_materials = parser.get_skybox_materials()
+		if not skybox_materials:
+			self.log("Skybox: No skybox defined in worldspawn")
+			return []
+
+		with self.instrumentation.stage('skybox/resolve'):
+			skybox_files = mat_extractor.find_files(skybox_materials)
+		jobs = mat_extractor.get_copy_jobs(skybox_files)
+		if skybox_files:
+			with self.instrumentation.stage('skybox/copy'):
+				mat_extractor.copy_to_directory(skybox_files, output_dir, True)
+		self.log(f"Skybox: {len(skybox_files)} found, {len(skybox_materials) - len(skybox_files)} missing")
+		return [relative_path for _, relative_path in jobs]
+
+	# Extract models (with includemodels, gibs and their materials) from VMF,
+	# returns the copied model and material relative paths
+	def _extract_models(self, parser: VMFParser, mdl_extractor: ModelExtractor, mat_extractor: MaterialExtractor, output_dir) -> Tuple[List[str], List[str]]:
+		self.log("Extracting models...")
+		models = mdl_extractor.extract_from_vmf(parser)
+		if not models:
+			return [], []
+
+		# Includemodels and gibs are resolved with their models
+		with self.instrumentation.stage('models/resolve'):
+			model_files, model_materials = mdl_extractor.resolve(models)
+		self.log(f"Models: {len(model_files)} found (with includemodels and gibs), {len(mdl_extractor.missing)} missing")
+
+		with self.instrumentation.stage('models/materials'):
+			model_material_files = mat_extractor.find_files(model_materials) if model_materials else {}
+		if model_materials:
+			self.log(f"Model materials: {len(model_material_files)} found, {len(mat_extractor.missing)} missing")
+
+		# Models and their materials are copied in one batch
+		material_jobs = mat_extractor.get_copy_jobs(model_material_files)
+		if model_files or model_material_files:
+			with self.instrumentation.stage('models/copy'):
+				mdl_extractor.copy_to_directory(model_files, output_dir, True, extra_jobs=material_jobs)
+
+		model_jobs = mdl_extractor.get_copy_jobs(model_files)
+		return [relative_path for _, relative_path in model_jobs], [relative_path for _, relative_path in material_jobs]
+
+	# Extract sounds from VMF, returns the copied relative paths
+	def _extract_sounds(self, parser: VMFParser, sound_extractor: SoundExtractor, output_dir) -> List[str]:
+		self.log("Extracting sounds...")
+		sounds = sound_extractor.extract_from_vmf(parser)
+		if not sounds:
+			return []
+
+		with self.instrumentation.stage('sounds/resolve'):
+			sound_files = sound_extractor.find_files(sounds)
+		jobs = sound_extractor.get_copy_jobs(sound_files)
+		if sound_files:
+			with self.instrumentation.stage('sounds/copy'):
+				sound_extractor.copy_to_directory(sound_files, output_dir, True)
+
+		self.log(f"Sounds: {len(sound_files)} found, {len(sound_extractor.missing)} missing")
+		return [relative_path for _, relative_path in jobs]
+
+	# Resolve, scan and copy every asset through overlapping queues instead of one stage after another,
+	# returns the copied relative paths per kind
+	def _extract_streaming(self, parser: VMFParser, mat_extractor: MaterialExtractor, mdl_extractor: ModelExtractor,
+						   sound_extractor: SoundExtractor, copy_engine: CopyEngine, output_dir) -> Dict[str, List[str]]:
+		self.log("Extracting materials, models and sounds (streaming)...")
+		streaming = StreamingExtraction(mat_extractor, mdl_extractor, sound_extractor, copy_engine, output_dir)
+		found = streaming.run(parser)
+
+		self.log(f"Materials: {streaming.counts['materials']} found, {len(mat_extractor.missing)} missing")
+		self.log(f"Models: {streaming.counts['models']} found (with includemodels and gibs), {len(mdl_extractor.missing)} missing")
+		self.log(f"Sounds: {streaming.counts['sounds']} found, {len(sound_extractor.missing)} missing")
+		return found
+
+	# Current totals of the counters attributed to stages
+	def _sample(self, content_index: ContentIndex, copy_engine: CopyEngine, mat_extractor: MaterialExtractor,
+				mdl_extractor: ModelExtractor, dependency_cache: Optional[DependencyCache]) -> Dict[str, int]:
+		return {
+			'files_copied': copy_engine.copied,
+			'files_linked': copy_engine.linked,
+			'files_skipped': copy_engine.skipped,
+			'bytes_copied': copy_engine.bytes_copied,
+			'copy_errors': len(copy_engine.errors),
+			'lookups': content_index.lookups,
+			'lookup_misses': content_index.lookup_misses,
+			'stat_calls': content_index.stat_calls,
+			'vmts_parsed': mat_extractor.vmts_parsed,
+			'mdls_parsed': mdl_extractor.mdls_parsed,
+			'cache_hits': dependency_cache.hits if dependency_cache is not None else 0,
+			'cache_misses': dependency_cache.misses if dependency_cache is not None else 0,
+		}
+
+	# Write missing.txt, returns the number of missing items
+	def _create_missing_file(self, output_dir, mat_extractor, mdl_extractor, sound_extractor, copy_engine) -> int:
+		try:
+			total_missing = write_missing_report(output_dir, mat_extractor, mdl_extractor, sound_extractor, copy_engine)
+		except Exception as e:
+			self.log(f"Error creating {REPORT_NAME}: {e}")
+			return 0
+
+		if total_missing > 0:
+			self.log(f"Missing files report saved: {REPORT_NAME} ({total_missing} items)")
+		else:
+			self.log(f"All files found! No {REPORT_NAME} needed.")
+		return total_missing
+
+
@@ -0,0 +1,87 @@
+import io
+import os
+from typing import Tuple, Union
+from output_sink import OutputSink
+
+REPORT_NAME = "missing.txt"
+
+
+# Build the missing files report, returns its text and the number of missing items
+def build_missing_report(mat_extractor, mdl_extractor, sound_extractor, copy_engine) -> Tuple[str, int]:
+	with io.StringIO() as f:
+		f.write("VMF Content Extractor - Missing Files Report\n")
+		f.write("=" * 50 + "\n\n")
+
+		# Missing materials
+		if mat_extractor.missing:
+			f.write(f"MISSING MATERIALS ({len(mat_extractor.missing)}):\n")
+			f.write("-" * 30 + "\n")
+			for material in sorted(mat_extractor.missing):
+				f.write(f"materials/{material}.vmt\n")
+			f.write("\n")
+
+		# Missing models
+		if mdl_extractor.missing:
+			f.write(f"MISSING MODELS ({len(mdl_extractor.missing)}):\n")
+			f.write("-" * 25 + "\n")
+			for model in sorted(mdl_extractor.missing):
+				f.write(f"models/{model}\n")
+			f.write("\n")
+
+		# Models found but not readable
+		if mdl_extractor.unparsable:
+			f.write(f"UNPARSABLE MODEL FILES ({len(mdl_extractor.unparsable)}):\n")
+			f.write("-" * 30 + "\n")
+			for file_path in sorted(mdl_extractor.unparsable):
+				f.write(f"{file_path}\n")
+			f.write("\n")
+
+		# Missing sounds
+		if sound_extractor.missing:
+			f.write(f"MISSING SOUNDS ({len(sound_extractor.missing)}):\n")
+			f.write("-" * 25 + "\n")
+			for sound in sorted(sound_extractor.missing):
+				f.write(f"sound/{sound}\n")
+			f.write("\n")
+
+		# Files found but not copied
+		if copy_engine.errors:
+			f.write(f"COPY ERRORS ({len(copy_engine.errors)}):\n")
+			f.write("-" * 25 + "\n")
+			for error in sorted(copy_engine.errors):
+				f.write(f"{error.source}: {error.error}\n")
+			f.write("\n")
+
+		# Summary
+		total_missing = (len(mat_extractor.missing) + len(mdl_extractor.missing) + len(mdl_extractor.unparsable) +
+						 len(sound_extractor.missing) + len(copy_engine.errors))
+		f.write(f"SUMMARY:\n")
+		f.write("-" * 15 + "\n")
+		f.write(f"Total missing files: {total_missing}\n")
+		f.write(f"- Materials: {len(mat_extractor.missing)}\n")
+		f.write(f"- Models: {len(mdl_extractor.missing)}\n")
+		f.write(f"- Unparsable model files: {len(mdl_extractor.unparsable)}\n")
+		f.write(f"- Sounds: {len(sound_extractor.missing)}\n")
+		f.write(f"- Copy errors: {len(copy_engine.errors)}\n")
+		report = f.getvalue()
+
+	return report, total_missing
+
+
+# Save the report into an output folder or archive (or remove a stale one), returns the number of missing items
+def write_missing_report(output_dir: Union[str, OutputSink], mat_extractor, mdl_extractor, sound_extractor, copy_engine) -> int:
+	report, total_missing = build_missing_report(mat_extractor, mdl_extractor, sound_extractor, copy_engine)
+
+	if isinstance(output_dir, OutputSink):
+		if total_missing > 0:
+			output_dir.add_bytes(REPORT_NAME, report.encode('utf-8'))
+	else:
+		missing_file_path = os.path.join(output_dir, REPORT_NAME)
+		if total_missing > 0:
+			os.makedirs(output_dir, exist_ok=True)
+			with open(missing_file_path, 'w', encoding='utf-8') as f:
+				f.write(report)
+		elif os.path.exists(missing_file_path):
+			os.remove(missing_file_path)
+
+	return total_missing
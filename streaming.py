@@ -0,0 +1,220 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from parser_vmf import VMFParser
+from extract_mat import MaterialExtractor
+from extract_mdl import ModelExtractor
+from extract_snd import SoundExtractor
+from copy_engine import CopyEngine, CopyError
+from output_sink import OutputSink
+
+# Asset kinds flowing through the queues
+MATERIAL = 'materials'
+MODEL = 'models'
+SOUND = 'sounds'
+
+
+class StreamingExtraction:
+	QUEUE_SIZE = 256
+	COPY_BATCH_SIZE = 64
+
+	# Init variables
+	def __init__(self, mat_extractor: MaterialExtractor, mdl_extractor: ModelExtractor, sound_extractor: SoundExtractor,
+				 copy_engine: CopyEngine, output_dir: Union[str, OutputSink]):
+		self.mat_extractor = mat_extractor
+		self.mdl_extractor = mdl_extractor
+		self.sound_extractor = sound_extractor
+		self.copy_engine = copy_engine
+		self.output_dir = output_dir
+		self._extractors = {MATERIAL: mat_extractor, MODEL: mdl_extractor, SOUND: sound_extractor}
+
+		# Relative paths queued for copy per kind, each destination copied once
+		self.found: Dict[str, List[str]] = {MATERIAL: [], MODEL: [], SOUND: []}
+		self.counts: Dict[str, int] = {MATERIAL: 0, MODEL: 0, SOUND: 0}
+		self._seen: Set[Tuple[str, str]] = set()
+		self._queued_paths: Set[str] = set()
+		self._pending = 0
+		self._idle: Optional[asyncio.Event] = None
+
+	# Run discovery -> resolve -> dependency scan -> copy with every stage overlapping, returns found relative paths per kind.
+	# Assets that fail are recorded as missing, unparsable or copy errors; anything else that fails is raised here
+	def run(self, parser: VMFParser) -> Dict[str, List[str]]:
+		asyncio.run(self._run(parser))
+		return self.found
+
+	async def _run(self, parser: VMFParser):
+		# Extractor state is not thread-safe: resolving and scanning each own one thread, copying uses the CopyEngine pool
+		resolve_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='resolve')
+		scan_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='scan')
+		copy_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='copy')
+
+		# Unbounded scan queue: model dependencies are fed back into the bounded resolve queue,
+		# so resolving must never wait on scanning or the two could block each other
+		resolve_queue: asyncio.Queue = asyncio.Queue(self.QUEUE_SIZE)
+		scan_queue: asyncio.Queue = asyncio.Queue()
+		copy_queue: asyncio.Queue = asyncio.Queue(self.QUEUE_SIZE)
+		self._idle = asyncio.Event()
+
+		workers = [
+			asyncio.create_task(self._resolve(resolve_queue, scan_queue, copy_queue, resolve_executor)),
+			asyncio.create_task(self._scan(scan_queue, resolve_queue, scan_executor)),
+		]
+		copier = asyncio.create_task(self._copy(copy_queue, copy_executor))
+		tasks = workers + [copier]
+
+		try:
+			await self._supervise(asyncio.create_task(self._discover(parser, resolve_queue)), tasks)
+			if self._pending == 0:
+				self._idle.set()
+			await self._supervise(asyncio.create_task(self._idle.wait()), tasks)
+
+			for worker in workers:
+				worker.cancel()
+			await asyncio.gather(*workers, return_exceptions=True)
+
+			# The copier drains the queue until it reads the end marker, unless it already failed
+			end = asyncio.create_task(copy_queue.put(None))
+			await asyncio.wait([end, copier], return_when=asyncio.FIRST_COMPLETED)
+			end.cancel()
+			await copier
+		finally:
+			# On failure the other stages are stopped before the error leaves run()
+			for task in tasks:
+				task.cancel()
+			await asyncio.gather(*tasks, return_exceptions=True)
+			resolve_executor.shutdown()
+			scan_executor.shutdown()
+			copy_executor.shutdown()
+
+	# Wait for a task while the stages run, a stage that stops before it is done failed and its error is raised
+	async def _supervise(self, task: asyncio.Task, stages: List[asyncio.Task]):
+		try:
+			done, _ = await asyncio.wait([task] + stages, return_when=asyncio.FIRST_COMPLETED)
+			for stage in stages:
+				if stage in done:
+					stage.result()
+					raise RuntimeError("Streaming stage stopped unexpectedly")
+			return task.result()
+		finally:
+			task.cancel()
+
+	# Queue an asset once, waiting while the resolve queue is full
+	async def _enqueue(self, resolve_queue: asyncio.Queue, kind: str, name: str):
+		if (kind, name) in self._seen:
+			return
+		self._seen.add((kind, name))
+		self._pending += 1
+		await resolve_queue.put((kind, name))
+
+	# One asset (and everything it queued) is done
+	def _done(self):
+		self._pending -= 1
+		if self._pending == 0:
+			self._idle.set()
+
+	# Feed every asset name the map references into the resolve queue
+	async def _discover(self, parser: VMFParser, resolve_queue: asyncio.Queue):
+		for material in sorted(self.mat_extractor.extract_from_vmf(parser)):
+			await self._enqueue(resolve_queue, MATERIAL, material)
+		for material in parser.get_skybox_materials():
+			await self._enqueue(resolve_queue, MATERIAL, material)
+		for model in sorted(self.mdl_extractor.extract_from_vmf(parser)):
+			await self._enqueue(resolve_queue, MODEL, model)
+		for sound in sorted(self.sound_extractor.extract_from_vmf(parser)):
+			await self._enqueue(resolve_queue, SOUND, sound)
+
+	# Locate the files of each asset (VMT scanning included), models go on to the dependency scan
+	async def _resolve(self, resolve_queue: asyncio.Queue, scan_queue: asyncio.Queue, copy_queue: asyncio.Queue, executor: ThreadPoolExecutor):
+		loop = asyncio.get_running_loop()
+
+		while True:
+			kind, name = await resolve_queue.get()
+			try:
+				try:
+					jobs, model_files = await loop.run_in_executor(executor, self._resolve_one, kind, name)
+				except Exception as e:
+					print(f"Unable to resolve {name}: {e}")
+					self._extractors[kind].missing.add(name)
+					jobs, model_files = [], None
+
+				for job in jobs:
+					await copy_queue.put((kind, job))
+				if model_files is not None:
+					self._pending += 1
+					scan_queue.put_nowait(model_files)
+			finally:
+				self._done()
+
+	# Blocking part of resolving one asset, returns its copy jobs and the model files to scan
+	def _resolve_one(self, kind: str, name: str):
+		if kind == MATERIAL:
+			material_files = self.mat_extractor.find_files({name})
+			if material_files:
+				self.counts[kind] += 1
+			return self.mat_extractor.get_copy_jobs(material_files), None
+
+		if kind == MODEL:
+			model_files = self.mdl_extractor.find_files({name})
+			files = model_files.get(name)
+			if not files:
+				return [], None
+			self.counts[kind] += 1
+			return self.mdl_extractor.get_copy_jobs(model_files), files
+
+		sound_files = self.sound_extractor.find_files({name})
+		if sound_files:
+			self.counts[kind] += 1
+		return self.sound_extractor.get_copy_jobs(sound_files), None
+
+	# Parse found models and queue the models and materials they reference
+	async def _scan(self, scan_queue: asyncio.Queue, resolve_queue: asyncio.Queue, executor: ThreadPoolExecutor):
+		loop = asyncio.get_running_loop()
+
+		while True:
+			files = await scan_queue.get()
+			try:
+				try:
+					dependencies = await loop.run_in_executor(executor, self.mdl_extractor.scan_dependencies, files)
+				except Exception as e:
+					print(f"Unable to scan model {files['.mdl']}: {e}")
+					self.mdl_extractor.unparsable.add(files['.mdl'])
+					continue
+
+				for model in sorted(dependencies.include_models | dependencies.models):
+					await self._enqueue(resolve_queue, MODEL, model)
+				for material in sorted(dependencies.materials):
+					await self._enqueue(resolve_queue, MATERIAL, material)
+			finally:
+				self._done()
+
+	# Copy whatever is queued in small batches so files land in the output as soon as they are resolved
+	async def _copy(self, copy_queue: asyncio.Queue, executor: ThreadPoolExecutor):
+		loop = asyncio.get_running_loop()
+		finished = False
+
+		while not finished:
+			batch = []
+			item = await copy_queue.get()
+			while item is not None:
+				self._add_job(batch, *item)
+				if len(batch) >= self.COPY_BATCH_SIZE or copy_queue.empty():
+					break
+				item = copy_queue.get_nowait()
+			finished = item is None
+
+			if batch:
+				try:
+					await loop.run_in_executor(executor, self.copy_engine.copy_files, batch, self.output_dir)
+				except Exception as e:
+					# copy_files reports per-file errors itself, this batch failed as a whole
+					self.copy_engine.errors.extend(CopyError(source, relative_path, str(e)) for source, relative_path in batch)
+
+	# Add a copy job unless its destination was already queued
+	def _add_job(self, batch: List[Tuple[str, str]], kind: str, job: Tuple[str, str]):
+		relative_path = job[1].replace('\\', '/')
+		if relative_path in self._queued_paths:
+			return
+		self._queued_paths.add(relative_path)
+		self.found[kind].append(relative_path)
+		batch.append(job)
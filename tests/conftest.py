@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# The modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mdl_builder
+
+
+# Writes minimal MDL files: build_mdl(textures, cd_directories) -> bytes
+@pytest.fixture
+def build_mdl():
+	return mdl_builder.build_mdl
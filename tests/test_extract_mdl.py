@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from content_index import ContentIndex
+from dependency_cache import DependencyCache
+from extract_mdl import ModelExtractor
+from output_sink import VPKSink
+from parser_mdl import STUDIO_LAYOUTS
+
+
+# A minimal MDL whose $keyvalues reference other models
+def add_keyvalues(data: bytes, keyvalues: str) -> bytes:
+	layout = STUDIO_LAYOUTS[48]
+	values = dict(zip(layout.fields, layout.struct.unpack_from(data, 0)))
+	text = keyvalues.encode('ascii')
+	values.update(keyvalueindex=len(data), keyvaluesize=len(text), length=len(data) + len(text))
+	return layout.struct.pack(*(values[field] for field in layout.fields)) + data[layout.struct.size:] + text
+
+
+# Loose models next to a VPK whose data chunk is gone: parent.mdl pulls in the archived broken.mdl
+@pytest.fixture
+def content(tmp_path, build_mdl):
+	loose = tmp_path / 'loose' / 'models' / 'props'
+	loose.mkdir(parents=True)
+	(loose / 'parent.mdl').write_bytes(add_keyvalues(build_mdl(['parent_tex'], ['models/props/']), '"prop_data" { "gibmodel" "models/props/broken.mdl" }'))
+	(loose / 'good.mdl').write_bytes(build_mdl(['good_tex'], ['models/props/']))
+
+	sink = VPKSink(str(tmp_path / 'pak01_dir.vpk'))
+	sink.add_bytes('models/props/broken.mdl', build_mdl(['broken_tex'], ['models/props/']))
+	sink.add_bytes('models/props/broken.vvd', b'IDSV')
+	sink.close()
+	os.remove(tmp_path / 'pak01_000.vpk')
+
+	return [str(tmp_path / 'loose'), sink.dir_path]
+
+
+@pytest.mark.parametrize('parallel', [False, True])
+def test_missing_archive_chunk_is_skipped(tmp_path, content, parallel):
+	index = ContentIndex(content)
+	dependency_cache = DependencyCache(str(tmp_path / 'dependencies.db'))
+	extractor = ModelExtractor(content, index, parse_workers=2 if parallel else 1, dependency_cache=dependency_cache)
+	if parallel:
+		extractor.PARALLEL_THRESHOLD = 0
+
+	try:
+		model_files, materials = extractor.resolve({'models/props/parent.mdl', 'models/props/good.mdl'})
+	finally:
+		dependency_cache.close()
+
+	broken_mdl = index.find('models/props/broken.mdl')
+	assert set(model_files) == {'models/props/parent.mdl', 'models/props/good.mdl', 'models/props/broken.mdl'}
+	assert set(model_files['models/props/broken.mdl']) == {'.mdl', '.vvd'}
+	assert materials == {'models/props/parent_tex', 'models/props/good_tex'}
+	assert extractor.unparsable == {broken_mdl}
+	assert not extractor.missing
+
+	# The empty result of an unreadable model isn't cached for later runs
+	dependency_cache = DependencyCache(str(tmp_path / 'dependencies.db'))
+	try:
+		assert dependency_cache.get('mdl', broken_mdl, extractor._get_stamp(model_files['models/props/broken.mdl'])) is None
+	finally:
+		dependency_cache.close()
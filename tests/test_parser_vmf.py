@@ -0,0 +1,67 @@
+import pytest
+
+from parser_vmf import VMFParser, PROJECTION_ASSETS
+
+HIDDEN_VMF = '''versioninfo
+{
+	"editorversion" "400"
+}
+world
+{
+	"id" "1"
+	"classname" "worldspawn"
+	solid
+	{
+		"id" "2"
+		side
+		{
+			"material" "TOOLS/VISIBLE"
+		}
+	}
+	hidden
+	{
+		solid
+		{
+			"id" "3"
+			side
+			{
+				"material" "TOOLS/HIDDEN_WORLD"
+			}
+		}
+	}
+}
+hidden
+{
+	entity
+	{
+		"id" "4"
+		"classname" "prop_static"
+		"model" "models/hidden_prop.mdl"
+	}
+}
+hidden
+{
+	solid
+	{
+		"id" "5"
+		side
+		{
+			"material" "TOOLS/HIDDEN_SOLID"
+		}
+	}
+}
+'''
+
+
+@pytest.mark.parametrize('mapped', [False, True])
+@pytest.mark.parametrize('projection', [None, PROJECTION_ASSETS])
+def test_hidden_blocks_are_parsed(tmp_path, mapped, projection):
+	vmf_path = tmp_path / 'hidden.vmf'
+	vmf_path.write_text(HIDDEN_VMF)
+
+	parser = VMFParser(projection=projection)
+	assert parser.parse_file(str(vmf_path), mapped=mapped)
+
+	assert [entity.properties.get('model') for entity in parser.entities] == ['models/hidden_prop.mdl']
+	assert [brush.id for brush in parser.world_brushes] == ['2', '3', '5']
+	assert parser.get_all_materials() == {'tools/visible', 'tools/hidden_world', 'tools/hidden_solid'}
@@ -0,0 +1,68 @@
+import pytest
+
+from content_index import ContentIndex
+from copy_engine import CopyEngine
+from extract_mat import MaterialExtractor
+from extract_mdl import ModelExtractor
+from extract_snd import SoundExtractor
+from parser_vmf import load_vmf
+from streaming import StreamingExtraction
+
+VMF = '''entity
+{
+	"id" "1"
+	"classname" "prop_static"
+	"model" "models/props/good.mdl"
+}
+entity
+{
+	"id" "2"
+	"classname" "prop_static"
+	"model" "models/props/other.mdl"
+}
+'''
+
+
+@pytest.fixture
+def streaming(tmp_path, build_mdl):
+	models = tmp_path / 'content' / 'models' / 'props'
+	models.mkdir(parents=True)
+	(models / 'good.mdl').write_bytes(build_mdl(['good_tex'], ['models/props/']))
+	(models / 'other.mdl').write_bytes(build_mdl(['other_tex'], ['models/props/']))
+	(tmp_path / 'map.vmf').write_text(VMF)
+
+	content = [str(tmp_path / 'content')]
+	index = ContentIndex(content)
+	copy_engine = CopyEngine(index, max_workers=1)
+	extraction = StreamingExtraction(
+		MaterialExtractor(content, index, copy_engine), ModelExtractor(content, index, copy_engine, 1),
+		SoundExtractor(content, index, copy_engine), copy_engine, str(tmp_path / 'out'))
+	return extraction, load_vmf(str(tmp_path / 'map.vmf'), cache=False)
+
+
+def test_failed_asset_does_not_stop_the_run(streaming):
+	extraction, parser = streaming
+	find_files = extraction.mdl_extractor.find_files
+
+	def failing_find_files(model_paths):
+		if 'models/props/good.mdl' in model_paths:
+			raise OSError("unreadable")
+		return find_files(model_paths)
+
+	extraction.mdl_extractor.find_files = failing_find_files
+	found = extraction.run(parser)
+
+	assert found['models'] == ['models/props/other.mdl']
+	assert extraction.mdl_extractor.missing == {'models/props/good.mdl'}
+
+
+def test_unrecoverable_failure_is_raised(streaming):
+	extraction, parser = streaming
+
+	# Discovery runs outside the per-asset error handling, so its failure ends the run
+	def failing_extract_from_vmf(parser):
+		raise RuntimeError("broken stage")
+
+	extraction.sound_extractor.extract_from_vmf = failing_extract_from_vmf
+	with pytest.raises(RuntimeError, match="broken stage"):
+		extraction.run(parser)
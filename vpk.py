@@ -0,0 +1,133 @@
+import os
+import struct
+from typing import BinaryIO, Dict, NamedTuple, Optional
+
+
+class VPKEntry(NamedTuple):
+	crc: int
+	preload: bytes
+	archive_index: int
+	offset: int
+	length: int
+
+
+class VPKArchive:
+	SIGNATURE = 0x55aa1234
+	DIR_ARCHIVE_INDEX = 0x7fff
+	COPY_CHUNK_SIZE = 1 << 20
+
+	HEADER_V1 = struct.Struct('<III')
+	HEADER_V2 = struct.Struct('<IIIIIII')
+	ENTRY = struct.Struct('<IHHIIH')
+
+	# Init variables
+	def __init__(self, path: str):
+		self.path = path
+		self.entries: Dict[str, VPKEntry] = {}
+		self.data_offset = 0
+		self._parse_directory()
+
+	# Parse the directory tree once into lower-cased path -> entry
+	def _parse_directory(self):
+		with open(self.path, 'rb') as f:
+			header = f.read(self.HEADER_V2.size)
+			signature, version, tree_size = self.HEADER_V1.unpack_from(header)
+
+			if signature != self.SIGNATURE:
+				raise ValueError(f"Not a VPK file: {self.path}")
+			if version == 1:
+				header_size = self.HEADER_V1.size
+			elif version == 2:
+				header_size = self.HEADER_V2.size
+			else:
+				raise ValueError(f"Unsupported VPK version {version}: {self.path}")
+
+			f.seek(header_size)
+			tree = f.read(tree_size)
+
+		self.data_offset = header_size + tree_size
+		entry_size = self.ENTRY.size
+		pos = 0
+
+		# Tree layout: extension { path { filename entry } }, each level ends with an empty string
+		while True:
+			extension, pos = self._read_string(tree, pos)
+			if not extension:
+				break
+
+			while True:
+				directory, pos = self._read_string(tree, pos)
+				if not directory:
+					break
+
+				while True:
+					filename, pos = self._read_string(tree, pos)
+					if not filename:
+						break
+
+					crc, preload_size, archive_index, offset, length, _ = self.ENTRY.unpack_from(tree, pos)
+					pos += entry_size
+					preload = tree[pos:pos + preload_size]
+					pos += preload_size
+
+					name = filename if extension == ' ' else f"{filename}.{extension}"
+					full_path = name if directory == ' ' else f"{directory}/{name}"
+					self.entries[full_path.lower()] = VPKEntry(crc, preload, archive_index, offset, length)
+
+	# Read a null-terminated string from the directory tree
+	def _read_string(self, tree: bytes, pos: int):
+		end = tree.find(b'\0', pos)
+		if end < 0:
+			return '', len(tree)
+		return tree[pos:end].decode('utf-8', errors='ignore'), end + 1
+
+	# Path of the archive file holding the entry data
+	def _archive_path(self, archive_index: int) -> str:
+		if archive_index == self.DIR_ARCHIVE_INDEX:
+			return self.path
+
+		base = self.path[:-8] if self.path.lower().endswith('_dir.vpk') else self.path[:-4]
+		return f"{base}_{archive_index:03d}.vpk"
+
+	# Look up an entry by its path inside the archive
+	def get(self, path: str) -> Optional[VPKEntry]:
+		return self.entries.get(path.lower().replace('\\', '/'))
+
+	# Read the full contents of an entry
+	def read(self, entry: VPKEntry) -> bytes:
+		if not entry.length:
+			return entry.preload
+
+		with open(self._archive_path(entry.archive_index), 'rb') as f:
+			f.seek(self._data_position(entry))
+			return entry.preload + f.read(entry.length)
+
+	# Stream an entry into an open binary file
+	def copy_to(self, entry: VPKEntry, dest: BinaryIO):
+		dest.write(entry.preload)
+		remaining = entry.length
+		if not remaining:
+			return
+
+		with open(self._archive_path(entry.archive_index), 'rb') as f:
+			f.seek(self._data_position(entry))
+			while remaining > 0:
+				chunk = f.read(min(remaining, self.COPY_CHUNK_SIZE))
+				if not chunk:
+					raise EOFError(f"Truncated VPK archive: {self._archive_path(entry.archive_index)}")
+				dest.write(chunk)
+				remaining -= len(chunk)
+
+	# Absolute position of the entry data in its archive file
+	def _data_position(self, entry: VPKEntry) -> int:
+		if entry.archive_index == self.DIR_ARCHIVE_INDEX:
+			return self.data_offset + entry.offset
+		return entry.offset
+
+	def __len__(self) -> int:
+		return len(self.entries)
+
+
+# Check if a content path points to a VPK archive
+def is_vpk_path(path: str) -> bool:
+	return path.lower().endswith('.vpk') and os.path.isfile(path)